@@ -0,0 +1,140 @@
+"""
+Parametric generators for synthetic Filament components.
+
+    python -m benchmarks.generate pipeline 100 > pipeline-100.fil
+"""
+import sys
+from argparse import ArgumentParser
+from typing import List
+
+
+def at(offset: int) -> str:
+    return "G" if offset == 0 else f"(+ G {offset})"
+
+
+def component(
+    name: str,
+    in_ports: List[str],
+    out_port: str,
+    instances: List[str],
+    invokes: List[str],
+    connects: List[str],
+) -> str:
+    ports = "\n    ".join(["(interface[1] (G) go)", *in_ports, out_port])
+    return (
+        f"(comp {name}\n"
+        "  (events (event G))\n"
+        f"  (ports\n    {ports})\n"
+        "  (instantiate\n    " + "\n    ".join(instances) + ")\n"
+        "  (invoke\n    " + "\n    ".join(invokes) + ")\n"
+        "  (connect " + " ".join(connects) + "))\n"
+    )
+
+
+def pipeline(stages: int, name: str = "main") -> str:
+    """
+    A pipeline where every stage adds the previous stage's result to a new
+    input and registers it for the next cycle.
+    """
+    in_ports = ["(in-port[32] (G (+ G 1)) left)"]
+    instances, invokes = [], []
+    prev = "left"
+    for i in range(stages):
+        in_ports.append(f"(in-port[32] ({at(i)} {at(i + 1)}) x{i})")
+        instances.append(f"(A{i} (new Add[32]))")
+        instances.append(f"(R{i} (new Register[32]))")
+        invokes.append(f"(a{i} (A{i} ({at(i)}) {prev} x{i}))")
+        invokes.append(f"(r{i} (R{i} ({at(i)} {at(i + 2)}) a{i}.out))")
+        prev = f"r{i}.out"
+    out_port = f"(out-port[32] ({at(stages)} {at(stages + 1)}) out)"
+    return component(name, in_ports, out_port, instances, invokes, [f"(out r{stages - 1}.out)"])
+
+
+def adder_tree(width: int, name: str = "main") -> str:
+    """
+    A balanced tree of adders reducing `width` inputs, with a register after
+    every adder; an odd value out at any level is carried up by a register.
+    """
+    in_ports = [f"(in-port[32] (G (+ G 1)) in{i})" for i in range(width)]
+    instances, invokes = [], []
+    level, values = 0, [f"in{i}" for i in range(width)]
+    count = 0
+    while len(values) > 1:
+        nxt = []
+        for i in range(0, len(values) - 1, 2):
+            instances.append(f"(A{count} (new Add[32]))")
+            instances.append(f"(R{count} (new Register[32]))")
+            invokes.append(f"(a{count} (A{count} ({at(level)}) {values[i]} {values[i + 1]}))")
+            invokes.append(f"(r{count} (R{count} ({at(level)} {at(level + 2)}) a{count}.out))")
+            nxt.append(f"r{count}.out")
+            count += 1
+        if len(values) % 2:
+            instances.append(f"(C{count} (new Register[32]))")
+            invokes.append(f"(c{count} (C{count} ({at(level)} {at(level + 2)}) {values[-1]}))")
+            nxt.append(f"c{count}.out")
+            count += 1
+        values = nxt
+        level += 1
+    out_port = f"(out-port[32] ({at(level)} {at(level + 1)}) out)"
+    return component(name, in_ports, out_port, instances, invokes, [f"(out {values[0]})"])
+
+
+def register_chain(depth: int, name: str = "main") -> str:
+    """
+    A shift register of `depth` registers, each passing its value on a cycle later.
+    """
+    in_ports = ["(in-port[32] (G (+ G 1)) in)"]
+    instances, invokes = [], []
+    prev = "in"
+    for i in range(depth):
+        instances.append(f"(R{i} (new Register[32]))")
+        invokes.append(f"(r{i} (R{i} ({at(i)} {at(i + 2)}) {prev}))")
+        prev = f"r{i}.out"
+    out_port = f"(out-port[32] ({at(depth)} {at(depth + 1)}) out)"
+    return component(name, in_ports, out_port, instances, invokes, [f"(out {prev})"])
+
+
+def library(count: int, stages: int = 8) -> str:
+    """
+    A file of `count` independent pipeline components.
+    """
+    return "\n".join(pipeline(stages, name=f"pipe{i}") for i in range(count))
+
+
+def hierarchy(count: int, depth: int = 8, name: str = "main") -> str:
+    """
+    A chain of `count` instances of one register chain component, defined in
+    the same file, each starting when the previous one's output is ready.
+    """
+    in_ports = ["(in-port[32] (G (+ G 1)) in)"]
+    instances, invokes = [], []
+    prev = "in"
+    for i in range(count):
+        instances.append(f"(C{i} (new chain[32]))")
+        invokes.append(f"(c{i} (C{i} ({at(i * depth)}) {prev}))")
+        prev = f"c{i}.out"
+    out_port = f"(out-port[32] ({at(count * depth)} {at(count * depth + 1)}) out)"
+    top = component(name, in_ports, out_port, instances, invokes, [f"(out {prev})"])
+    return register_chain(depth, name="chain") + "\n" + top
+
+
+GENERATORS = {
+    "pipeline": pipeline,
+    "adder-tree": adder_tree,
+    "register-chain": register_chain,
+    "library": library,
+    "hierarchy": hierarchy,
+}
+
+
+def main(argv=None) -> int:
+    parser = ArgumentParser(description="Generate a synthetic Filament design")
+    parser.add_argument("design", choices=sorted(GENERATORS))
+    parser.add_argument("size", type=int)
+    args = parser.parse_args(argv)
+    sys.stdout.write(GENERATORS[args.design](args.size))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Per-stage scaling benchmarks for the compiler pipeline.
+
+Times parsing, elaboration (Component.from_sexpr), constraint solving and
+lowering separately for each synthetic design across a range of sizes, and
+records the peak memory of each stage.
+
+    python -m benchmarks.run [--quick] [--output results.json] [--compare old.json]
+"""
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+import pyfilament as pyf
+from benchmarks.generate import GENERATORS
+
+STAGES = ("parse", "elaborate", "solve", "lower")
+
+SIZES = {
+    "pipeline": (10, 100, 1000),
+    "adder-tree": (16, 256, 2048),
+    "register-chain": (10, 100, 1000),
+    "library": (10, 100, 500),
+    "hierarchy": (10, 100, 1000),
+}
+
+QUICK_SIZES = {
+    "pipeline": (10, 100),
+    "adder-tree": (16, 128),
+    "register-chain": (10, 100),
+    "library": (10, 50),
+    "hierarchy": (10, 100),
+}
+
+
+def run_stages(source: str):
+    """
+    Run every stage over all components of the source, yielding the stage
+    name and a callable that performs it.
+    """
+    state = {}
+
+    def parse():
+        state["exprs"] = pyf.parse(source)
+
+    def elaborate():
+        state["comps"] = [pyf.Component.from_sexpr(expr) for expr in state["exprs"]]
+
+    def solve():
+        for comp in state["comps"]:
+            if pyf.solve_component_constraints(comp, use_cache=False) is None:
+                raise RuntimeError("Benchmark design has unsatisfiable constraints")
+
+    def lower():
+        for comp in state["comps"]:
+            pyf.generate_lower(comp)
+
+    return list(zip(STAGES, (parse, elaborate, solve, lower)))
+
+
+def measure(source: str, repeat: int) -> dict:
+    """
+    Best-of-`repeat` wall time for each stage, plus the peak traced memory
+    of each stage from one extra, separately traced run.
+    """
+    times = {stage: float("inf") for stage in STAGES}
+    for _ in range(repeat):
+        for stage, step in run_stages(source):
+            start = time.perf_counter()
+            step()
+            times[stage] = min(times[stage], time.perf_counter() - start)
+
+    peaks = {}
+    for stage, step in run_stages(source):
+        tracemalloc.start()
+        step()
+        peaks[stage] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {stage: {"seconds": times[stage], "peak_bytes": peaks[stage]} for stage in STAGES}
+
+
+def compare(results: dict, baseline: dict):
+    """
+    Print the time ratio of each stage against a previous results file.
+    """
+    previous = {
+        (entry["design"], entry["size"]): entry["stages"] for entry in baseline["results"]
+    }
+    print(f"\n{'design':<16} {'size':>6}  " + "  ".join(f"{s:>10}" for s in STAGES))
+    for entry in results["results"]:
+        old = previous.get((entry["design"], entry["size"]))
+        if old is None:
+            continue
+        ratios = []
+        for stage in STAGES:
+            before = old[stage]["seconds"]
+            after = entry["stages"][stage]["seconds"]
+            ratios.append(f"{after / before:>9.2f}x" if before > 0 else f"{'-':>10}")
+        print(f"{entry['design']:<16} {entry['size']:>6}  " + "  ".join(ratios))
+
+
+def main(argv=None) -> int:
+    parser = ArgumentParser(description="Per-stage compiler benchmarks")
+    parser.add_argument("--design", action="append", choices=sorted(GENERATORS))
+    parser.add_argument("--size", action="append", type=int, help="override the default sizes")
+    parser.add_argument("--quick", action="store_true", help="use small sizes only")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="a previous JSON results file to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    results = {
+        "version": pyf.__version__,
+        "python": platform.python_version(),
+        "results": [],
+    }
+
+    print(f"{'design':<16} {'size':>6}  " + "  ".join(f"{s:>10}" for s in STAGES) + "  peak")
+    for design in args.design or sorted(GENERATORS):
+        for size in args.size or sizes[design]:
+            stages = measure(GENERATORS[design](size), args.repeat)
+            results["results"].append({"design": design, "size": size, "stages": stages})
+            peak = max(stage["peak_bytes"] for stage in stages.values())
+            print(
+                f"{design:<16} {size:>6}  "
+                + "  ".join(f"{stages[s]['seconds'] * 1000:>8.1f}ms" for s in STAGES)
+                + f"  {peak / 1e6:.1f}MB"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fp:
+            compare(results, json.load(fp))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Startup-time guard for the parse and lowering paths.
+
+Runs each scenario in a fresh interpreter, reports the best wall time over
+several runs minus the cost of a bare interpreter, and fails if a scenario
+imports z3 or exceeds its time budget.
+
+    python -m benchmarks.startup [--runs N] [--budget-ms MS]
+"""
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+EXAMPLE = str(ROOT / "examples" / "add-mult.fil")
+
+SCENARIOS = {
+    "import": ["-c", "import pyfilament"],
+    "parse": ["-c", f"import pyfilament as pyf; pyf.parse_file({EXAMPLE!r})"],
+    "elaborate": [
+        "-c",
+        "import pyfilament as pyf, pyfilament.lower; "
+        f"pyf.Component.from_sexpr(next(pyf.iter_file({EXAMPLE!r})))",
+    ],
+    "main --parse-only": [str(ROOT / "main.py"), EXAMPLE, "--parse-only"],
+    # Elaborates and lowers without solving, so z3 must stay unloaded
+    "main --no-solve": [str(ROOT / "main.py"), EXAMPLE, "--no-solve"],
+}
+
+
+def run(args, runs: int) -> float:
+    """
+    Return the best wall time over `runs` executions of the interpreter.
+    """
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def imports_z3(args) -> bool:
+    """
+    Check whether running the interpreter with these arguments imports z3.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return any(line.rsplit("|", 1)[-1].strip() == "z3" for line in proc.stderr.splitlines())
+
+
+def main(argv=None) -> int:
+    parser = ArgumentParser(description="Startup-time guard for pyfilament")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=75.0,
+        help="maximum startup cost over a bare interpreter, per scenario",
+    )
+    args = parser.parse_args(argv)
+
+    baseline = run(["-c", "pass"], args.runs)
+    reference = run(["-c", "import z3"], args.runs) - baseline
+    print(f"{'interpreter':<20} {baseline * 1000:8.1f} ms")
+    print(f"{'import z3':<20} {reference * 1000:8.1f} ms  (reference)")
+
+    failed = False
+    for name, scenario in SCENARIOS.items():
+        overhead = (run(scenario, args.runs) - baseline) * 1000
+        if imports_z3(scenario):
+            status = "FAIL: imports z3"
+        elif overhead > args.budget_ms:
+            status = f"FAIL: over {args.budget_ms:.0f} ms budget"
+        else:
+            status = "ok"
+        failed |= status != "ok"
+        print(f"{name:<20} {overhead:8.1f} ms  {status}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
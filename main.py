@@ -1,24 +1,247 @@
+import glob
+import json
+import sys
 from argparse import ArgumentParser
 
 import pyfilament as pyf
+from pyfilament import metrics
 
 argv = ArgumentParser()
-argv.add_argument("filename")
+argv.add_argument(
+    "filenames",
+    nargs="*",
+    help="a file to compile, or several files, directories or globs to batch compile",
+)
 argv.add_argument("--debug", action="store_true", default=False)
+argv.add_argument(
+    "--parse-only",
+    action="store_true",
+    default=False,
+    help="print the parsed S-expression and stop",
+)
+argv.add_argument(
+    "--no-solve",
+    action="store_true",
+    default=False,
+    help="skip constraint solving and go straight to lowering",
+)
+argv.add_argument(
+    "--jobs",
+    "-j",
+    type=int,
+    default=None,
+    help="batch compile every component using this many worker processes",
+)
+argv.add_argument(
+    "--no-cache",
+    action="store_true",
+    default=False,
+    help="neither read from nor write to the on-disk compilation cache",
+)
+argv.add_argument(
+    "--simulate",
+    metavar="N",
+    type=int,
+    default=None,
+    help="simulate the lowered component on N random input vectors and check its output windows",
+)
+argv.add_argument(
+    "--portfolio",
+    action="store_true",
+    default=False,
+    help="race several z3 configurations on constraints the native solver cannot handle",
+)
+argv.add_argument(
+    "--serve",
+    metavar="SOCKET",
+    nargs="?",
+    const="-",
+    default=None,
+    help="run a compile server on a Unix socket, or on stdin/stdout by default",
+)
+argv.add_argument(
+    "--client",
+    metavar="SOCKET",
+    default=None,
+    help="compile the given files on the server listening on SOCKET",
+)
+argv.add_argument(
+    "--profile",
+    action="store_true",
+    default=False,
+    help="print per-stage timings, counters and a cProfile report to stderr",
+)
+argv.add_argument(
+    "--metrics-json",
+    metavar="PATH",
+    default=None,
+    help="write per-stage timings, counters and z3 statistics as JSON",
+)
 
-if __name__ == "__main__":
-    args = argv.parse_args()
-    expr = pyf.parse_file(args.filename)[0]
-    if args.debug:
+
+def report(results) -> int:
+    failed = 0
+    for result in results:
+        if result.metrics is not None:
+            metrics.active.merge(result.metrics)
+        if result.index is None:
+            print(f"== {result.path} ==")
+        else:
+            print(f"== {result.path}[{result.index}] {result.name} ==")
+        if result.ok:
+            print(f"{result.lowered}\n")
+        else:
+            failed += 1
+            print(f"error: {result.error}\n")
+    return 1 if failed else 0
+
+
+def batch(args) -> int:
+    from pyfilament.compiler import compile_files
+
+    results = compile_files(
+        args.filenames,
+        jobs=args.jobs,
+        use_cache=not args.no_cache,
+        portfolio=args.portfolio,
+        collect_metrics=metrics.active is not None,
+    )
+    return report(results)
+
+
+def client(args) -> int:
+    from pyfilament.compiler import expand_paths
+    from pyfilament.server import CompileClient
+
+    with CompileClient(args.client) as conn:
+        return report(
+            result for path in expand_paths(args.filenames) for result in conn.compile(path)
+        )
+
+
+def compile_one(args) -> int:
+    with metrics.stage("parse"):
+        exprs = pyf.iter_file(args.filenames[0])
+        expr = next(exprs)
+    if args.debug or args.parse_only:
         print(f"S-Expression Form: \n-----\n{expr}\n")
+    if args.parse_only:
+        return 0
 
-    comp = pyf.Component.from_sexpr(expr)
+    from pyfilament.registry import Registry, primitives_with
+
+    # The rest of the file may define components this one instantiates
+    with metrics.stage("parse"):
+        exprs = [expr, *exprs]
+    registry = Registry()
+    try:
+        name = registry.register(expr)
+    except RuntimeError as err:
+        # The compiler module loads the process pool machinery, which only
+        # batch mode needs
+        from pyfilament.compiler import describe_error
+
+        print(f"error: {describe_error(err)}")
+        return 1
+    for other in exprs[1:]:
+        try:
+            registry.register(other)
+        except RuntimeError:
+            # Only the first component is compiled here; batch mode reports
+            # problems with the others
+            pass
+    callees = registry.callee_summaries(name)
+
+    comp = None
+    if args.debug or args.no_solve or args.simulate is not None:
+        with metrics.stage("elaborate"):
+            comp = pyf.Component.from_sexpr(expr)
     if args.debug:
         print(f"Component Object Form: \n-----\n{comp}\n")
+        from pyfilament.intervals import InvokeIndex
 
-    constraints = pyf.solve_component_constraints(comp)
-    if args.debug:
-        print(f"Z3-Solver Constraints: \n-----\n{constraints}\n")
+        index = InvokeIndex(comp)
+        print(
+            f"Resources: \n-----\nlatency {index.latency()}, "
+            f"initiation interval {index.initiation_interval()}\n"
+        )
 
-    lower_fil = pyf.generate_lower(comp)
+    if args.no_solve:
+        with metrics.stage("lower"):
+            lower_fil = repr(pyf.generate_lower(comp, primitives_with(callees)))
+    else:
+        from pyfilament.check import TimingError
+        from pyfilament.compiler import compile_expr
+
+        try:
+            schedule, lower_fil = compile_expr(
+                expr, use_cache=not args.no_cache, portfolio=args.portfolio, callees=callees
+            )
+        except TimingError as err:
+            print(f"{err.summary}:\n-----\n" + "\n".join(map(repr, err.diagnostics)))
+            return 1
+        except RuntimeError as err:
+            # Imported here so compiling does not load z3 up front
+            from pyfilament.z3_solver import SolverTimeout
+
+            if not isinstance(err, SolverTimeout):
+                raise
+            print(f"Solver timed out:\n-----\n{err}")
+            return 1
+        if args.debug:
+            print(f"Z3-Solver Constraints: \n-----\n{schedule}\n")
     print(f"Lower Filament Form: \n-----\n{lower_fil}\n")
+
+    if args.simulate is not None:
+        from pyfilament.simulate import random_inputs, simulate
+
+        # The simulator needs the lowered component itself, not its text
+        with metrics.stage("lower"):
+            lowered = pyf.generate_lower(comp, primitives_with(callees))
+        with metrics.stage("simulate"):
+            result = simulate(lowered, random_inputs(lowered.signature, args.simulate))
+        print(f"Simulation: \n-----\n{result}")
+        for violation in result.violations:
+            print(violation)
+        return 0 if result.ok else 1
+    return 0
+
+
+def run(args) -> int:
+    if args.serve is not None:
+        from pyfilament.server import serve
+
+        serve(args.serve, use_cache=not args.no_cache)
+        return 0
+    if not args.filenames:
+        argv.error("the following arguments are required: filenames")
+    if args.client is not None:
+        return client(args)
+    if len(args.filenames) > 1 or args.jobs is not None or glob.has_magic(args.filenames[0]):
+        return batch(args)
+    return compile_one(args)
+
+
+if __name__ == "__main__":
+    args = argv.parse_args()
+    if not args.profile and args.metrics_json is None:
+        raise SystemExit(run(args))
+
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    with metrics.collect(profiler=profiler) as measured:
+        with metrics.stage("total"):
+            status = run(args)
+
+    if args.metrics_json is not None:
+        with open(args.metrics_json, "w", encoding="utf-8") as fp:
+            json.dump(measured.as_dict(), fp, indent=2)
+    if args.profile:
+        import pstats
+
+        print(f"Pipeline Metrics: \n-----\n{measured.summary()}\n", file=sys.stderr)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+    raise SystemExit(status)
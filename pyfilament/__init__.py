@@ -1,5 +1,23 @@
-from pyfilament.parse import parse, parse_file
+__version__ = "0.1.0"
+
+from pyfilament.parse import parse, parse_file, iter_file
 from pyfilament.sexpr import SExpr, can_eval, eval_expr
 from pyfilament.component import Signature, Component
-from pyfilament.z3_solver import solve_component_constraints
 from pyfilament.lower import generate_lower
+
+# Attributes whose modules import z3, loaded on first access so that parsing
+# and lowering never pay for the z3 native library.
+_lazy_attrs = {
+    "solve_component_constraints": "pyfilament.z3_solver",
+    "SolverSession": "pyfilament.z3_solver",
+}
+
+
+def __getattr__(name):
+    if name in _lazy_attrs:
+        import importlib
+
+        value = getattr(importlib.import_module(_lazy_attrs[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional
+
+from pyfilament import __version__
+from pyfilament.sexpr import SExpr
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Puts between rescans of the directory, to pick up other processes' writes
+RESCAN_EVERY = 256
+
+_compiler_digest = None
+
+
+def compiler_digest() -> bytes:
+    """
+    A hash of the compiler's own sources, so that entries written by any
+    other revision of the compiler are never reused.
+    """
+    global _compiler_digest
+    if _compiler_digest is None:
+        digest = hashlib.sha256(__version__.encode())
+        package = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(package)):
+            if name.endswith(".py"):
+                with open(os.path.join(package, name), "rb") as fp:
+                    digest.update(b"\0" + name.encode() + b"\0" + fp.read())
+        _compiler_digest = digest.digest()
+    return _compiler_digest
+
+
+def default_cache_dir() -> str:
+    """
+    The cache directory: $PYFILAMENT_CACHE_DIR, else pyfilament under
+    $XDG_CACHE_HOME or ~/.cache.
+    """
+    if "PYFILAMENT_CACHE_DIR" in os.environ:
+        return os.environ["PYFILAMENT_CACHE_DIR"]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pyfilament")
+
+
+class CompileCache:
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        A content-addressed on-disk cache of compilation results.
+
+        Entries are JSON files named by the hash of a component's canonical
+        S-expression and the compiler sources. They are written atomically,
+        so several processes can share one cache directory, and the least
+        recently used entries are evicted once the cache outgrows max_bytes.
+
+        Args:
+            directory (Optional[str]): Where to keep entries.
+            max_bytes (int): Size the cache is trimmed back under after a write.
+        """
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        # Bytes in the cache as of the last scan plus this process's writes
+        # since, or None before the first scan
+        self.total: Optional[int] = None
+        self.puts_since_scan = 0
+
+    @staticmethod
+    def key(expr: SExpr | str, context: str = "") -> str:
+        """
+        Hash a component; its printed form is independent of layout and comments.
+        `context` covers anything else the compiled output depends on, such as
+        the timing of the components it instantiates.
+        """
+        digest = hashlib.sha256()
+        digest.update(compiler_digest())
+        digest.update(b"\0")
+        digest.update(str(expr).encode())
+        if context:
+            digest.update(b"\0")
+            digest.update(context.encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self.path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as fp:
+                entry = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Unreadable entry; drop it and recompute
+            self.remove(path)
+            return None
+        # The modification time doubles as the last-use time for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, entry: dict):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.stat(path).st_size
+        except OSError:
+            replaced = 0
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                json.dump(entry, fp)
+                size = fp.tell()
+            os.replace(tmp, path)
+        except BaseException:
+            self.remove(tmp)
+            raise
+
+        self.puts_since_scan += 1
+        if self.total is None or self.puts_since_scan >= RESCAN_EVERY:
+            self.evict()
+            return
+        self.total += size - replaced
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        This scans the whole directory, so `put` only calls it when its own
+        running total says the cache may be too big, or every RESCAN_EVERY
+        puts to account for other processes.
+        """
+        self.puts_since_scan = 0
+        entries = []
+        total = 0
+        for shard in self.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in self.scandir(shard.path):
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                self.remove(path)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self.total = total
+
+    def clear(self):
+        self.total = None
+        for shard in self.scandir(self.directory):
+            if shard.is_dir():
+                for entry in self.scandir(shard.path):
+                    self.remove(entry.path)
+
+    @staticmethod
+    def scandir(path: str):
+        try:
+            with os.scandir(path) as it:
+                return list(it)
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def remove(path: str):
+        # Another process may have evicted the same file first
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_default_cache = None
+
+
+def default_cache() -> CompileCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = CompileCache()
+    return _default_cache
@@ -0,0 +1,153 @@
+"""
+A solver-result cache shared by components that differ only in names.
+
+The timing constraints of a component only depend on the shape of its
+commands: which names are instances, invokes and ports, the events each
+invoke and port is scheduled at, and which names each connection joins.
+`canonical_form` alpha-renames every port and command variable to its
+index in order of appearance, so a family of components generated from one
+template shares a single normal form. Schedules are cached under that form,
+in memory and in the on-disk cache, and renamed back on a hit, so only the
+first of them reaches a solver.
+
+Event variables keep their names: the solvers pin the event `G` to cycle 0
+by name.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from pyfilament import metrics
+from pyfilament.cache import CompileCache, default_cache
+from pyfilament.command import Connect, Instance, Invoke
+from pyfilament.component import Component
+from pyfilament.event import Event
+
+# Schedules kept in memory, by canonical form
+MAX_ENTRIES = 1024
+
+
+# A normal form: a flat tuple of tags, canonical name indices and events,
+# which are hash-consed and so compare by identity
+Form = Tuple[Union[str, int, Event], ...]
+
+
+def canonical_form(component: Component) -> Tuple[Form, List[str]]:
+    """
+    The normal form of a component's constraint system, and the original
+    name of each canonical name, by index.
+    """
+    # Symbol -> canonical name
+    ids: Dict[int, int] = {}
+    signature = component.signature
+    graph = component.graph
+    symbols = component.symbols
+    form: list = [str(signature.event[0][1])]
+    for port in signature.in_ports:
+        form += ("in", ids.setdefault(symbols.get(port.name), len(ids)), port.range_.lo)
+    for port in signature.out_ports:
+        form += ("out", ids.setdefault(symbols.get(port.name), len(ids)), port.range_.lo)
+    for cmd in component.commands:
+        if isinstance(cmd, Instance):
+            form += ("new", ids.setdefault(graph.symbol(cmd), len(ids)))
+        elif isinstance(cmd, Invoke):
+            form += ("invoke", ids.setdefault(graph.symbol(cmd), len(ids)), cmd.range_.lo)
+            if cmd.range_.hi is not None:
+                form.append(cmd.range_.hi)
+        elif isinstance(cmd, Connect):
+            src, dest = graph.connect_refs(cmd)
+            form += ("connect", ids.setdefault(dest[0], len(ids)), ids.setdefault(src[0], len(ids)))
+    return tuple(form), [symbols.names[sym] for sym in ids]
+
+
+def form_text(form: Form) -> str:
+    """
+    A normal form as text, for keying the on-disk cache. Events are marked
+    so they cannot be mistaken for tags.
+    """
+    return " ".join(f"@{item.expr}" if isinstance(item, Event) else str(item) for item in form)
+
+
+def to_canonical(schedule: dict, names: List[str]) -> dict:
+    ids = {name: index for index, name in enumerate(names)}
+    return {
+        # (canonical index, time) pairs, in the solver's order
+        "start_times": [[ids[name], time] for name, time in schedule["start_times"].items()],
+        "states": dict(schedule["states"]),
+    }
+
+
+def from_canonical(schedule: dict, names: List[str]) -> dict:
+    return {
+        "start_times": {names[index]: time for index, time in schedule["start_times"]},
+        "states": dict(schedule["states"]),
+    }
+
+
+class StructuralCache:
+    def __init__(self, disk: Optional[CompileCache] = None, max_entries: int = MAX_ENTRIES):
+        """
+        Solved schedules by canonical form: the most recently used in
+        memory, backed by the on-disk cache.
+
+        Args:
+            disk (Optional[CompileCache]): Where to persist schedules; the
+                default cache if None.
+            max_entries (int): How many schedules to keep in memory.
+        """
+        self.disk = disk
+        self.max_entries = max_entries
+        # Canonical form -> {"schedule": canonical schedule or None if unsat}
+        self.entries: "OrderedDict[Form, dict]" = OrderedDict()
+
+    def get(self, form: Form) -> Optional[dict]:
+        entry = self.entries.get(form)
+        if entry is not None:
+            self.entries.move_to_end(form)
+            return entry
+        disk = self.disk or default_cache()
+        entry = disk.get(disk.key(form_text(form), "schedule"))
+        if entry is not None:
+            self.remember(form, entry)
+        return entry
+
+    def put(self, form: Form, entry: dict):
+        self.remember(form, entry)
+        disk = self.disk or default_cache()
+        disk.put(disk.key(form_text(form), "schedule"), entry)
+
+    def remember(self, form: Form, entry: dict):
+        self.entries[form] = entry
+        self.entries.move_to_end(form)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+_default = None
+
+
+def default_structural_cache() -> StructuralCache:
+    global _default
+    if _default is None:
+        _default = StructuralCache()
+    return _default
+
+
+def solve_cached(
+    component: Component, solve: Callable[[Component], Optional[dict]]
+) -> Optional[dict]:
+    """
+    Solve a component with `solve`, unless a component of the same shape
+    was solved before, in which case its schedule is renamed to fit.
+    """
+    with metrics.stage("solve.canonicalize"):
+        form, names = canonical_form(component)
+    cache = default_structural_cache()
+    entry = cache.get(form)
+    if entry is not None:
+        metrics.count("structural_hits")
+        schedule = entry["schedule"]
+        return from_canonical(schedule, names) if schedule is not None else None
+    metrics.count("structural_misses")
+    schedule = solve(component)
+    cache.put(form, {"schedule": to_canonical(schedule, names) if schedule is not None else None})
+    return schedule
@@ -0,0 +1,366 @@
+"""
+Checks that explain why a design's timing is wrong.
+
+`precheck` makes one pass over a component and catches the obvious
+violations (inverted ranges, unknown names, values read outside the window
+they are available in, instances used twice at once) before any solver
+runs. `explain_unsat` is for designs that get past it but still have no
+schedule: it solves with z3 using one tracked assertion per command and
+reports the commands in the unsat core.
+"""
+from typing import Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from pyfilament.command import Command, Connect, Invoke
+from pyfilament.component import Component
+from pyfilament.event import Affine, Range
+from pyfilament.graph import NodeKind
+from pyfilament.intervals import InvokeIndex
+from pyfilament.signature import Signature
+
+# A window [lo, hi) of cycles, relative to the event variables
+Window = Tuple[Affine, Affine]
+
+
+class Primitive:
+    def __init__(
+        self,
+        events: int,
+        inputs: Sequence[str],
+        output: Tuple[int, Optional[int]],
+        needs: Tuple[int, int] = (0, 1),
+        outputs: Optional[Dict[str, Tuple[int, Optional[int]]]] = None,
+        port_needs: Optional[Dict[str, Tuple[int, int]]] = None,
+        interface: Optional[str] = None,
+    ):
+        """
+        The timing of a primitive component, relative to the first event it
+        is invoked with.
+
+        Args:
+            events (int): How many events an invocation takes.
+            inputs (Sequence[str]): The input ports, in argument order.
+            output (Tuple[int, Optional[int]]): The window its output is
+                valid in; an end of None means up to the last event of the
+                invocation.
+            needs (Tuple[int, int]): The window every input must be held for.
+            outputs (Optional[Dict[str, Tuple[int, Optional[int]]]]): The
+                window of each output port, for components with outputs other
+                than `out`.
+            port_needs (Optional[Dict[str, Tuple[int, int]]]): The window of
+                each input that is not held for `needs`.
+            interface (Optional[str]): The port that triggers an invocation,
+                if the component has one.
+        """
+        self.events = events
+        self.inputs = tuple(inputs)
+        self.output = output
+        self.needs = needs
+        self.outputs = outputs if outputs is not None else {"out": output}
+        self.port_needs = {name: needs for name in self.inputs}
+        self.port_needs.update(port_needs or {})
+        self.interface = interface
+
+    @staticmethod
+    def from_signature(signature: Signature) -> "Primitive":
+        """
+        The timing of a user-defined component, from its signature. Every
+        port must be available at a constant offset from its first event.
+        """
+        event = str(signature.event[0][1])
+
+        def offsets(port) -> Tuple[int, int]:
+            span = window(port.range_)
+            for end in span or ():
+                if any(var != event or coeff != 1 for var, coeff in end.terms):
+                    break
+            else:
+                if span is not None:
+                    return span[0].offset, span[1].offset
+            raise RuntimeError(
+                f"Port {port.name} of {signature.name} is not at a constant offset from {event}"
+            )
+
+        outputs = {port.name: offsets(port) for port in signature.out_ports}
+        return Primitive(
+            len(signature.event),
+            [port.name for port in signature.in_ports],
+            next(iter(outputs.values()), (0, 1)),
+            outputs=outputs,
+            port_needs={port.name: offsets(port) for port in signature.in_ports},
+            interface=signature.interface.name if signature.interface is not None else None,
+        )
+
+    def __repr__(self):
+        inputs = ", ".join(f"{name}@{self.port_needs[name]}" for name in self.inputs)
+        outputs = ", ".join(f"{name}@{span}" for name, span in self.outputs.items())
+        return f"Primitive({self.events} event(s), ({inputs}) -> ({outputs}))"
+
+
+PRIMITIVES: Dict[str, Primitive] = {
+    "Add": Primitive(1, ("left", "right"), (0, 1)),
+    "And": Primitive(1, ("left", "right"), (0, 1)),
+    "Or": Primitive(1, ("left", "right"), (0, 1)),
+    "Xor": Primitive(1, ("left", "right"), (0, 1)),
+    "Mult": Primitive(1, ("left", "right"), (2, 3)),
+    "Mux": Primitive(1, ("sel", "in0", "in1"), (0, 1)),
+    "Register": Primitive(2, ("in",), (1, None)),
+}
+
+
+class Diagnostic:
+    def __init__(self, message: str, commands: Optional[List[Command]] = None):
+        """
+        One reason a component cannot be scheduled.
+
+        Args:
+            message (str): What is wrong.
+            commands (Optional[List[Command]]): The commands involved.
+        """
+        self.message = message
+        self.commands = commands or []
+
+    def __repr__(self):
+        return self.message
+
+
+class TimingError(RuntimeError):
+    def __init__(self, summary: str, diagnostics: List[Diagnostic]):
+        """
+        A component whose timing constraints cannot be met.
+
+        Args:
+            summary (str): Headline for the error message.
+            diagnostics (List[Diagnostic]): Why, one entry per problem found.
+        """
+        self.summary = summary
+        self.diagnostics = diagnostics
+        details = "".join(f"\n  {diagnostic}" for diagnostic in diagnostics)
+        super().__init__(f"{summary}:{details}" if diagnostics else summary)
+
+
+def window(range_: Range) -> Optional[Window]:
+    """
+    The window a range covers, or None if an end is not affine.
+    """
+    lo = range_.lo.linear
+    if lo is None:
+        return None
+    hi = range_.hi.linear if range_.hi is not None else shift(lo, 1)
+    if hi is None:
+        return None
+    return lo, hi
+
+
+def shift(base: Affine, offset: int) -> Affine:
+    return base + Affine((), offset)
+
+
+def definitely_before(later: Affine, earlier: Affine) -> bool:
+    """
+    Whether `later` is known to be strictly before `earlier`.
+    """
+    gap = later - earlier
+    return not gap.terms and gap.const < 0
+
+
+def show(window_: Window) -> str:
+    return f"[{window_[0]}, {window_[1]})"
+
+
+class Prechecker:
+    def __init__(self, component: Component, primitives: Optional[Mapping[str, Primitive]] = None):
+        """
+        State for one linear pass of precheck over a component.
+
+        Args:
+            component (Component): The component to check.
+            primitives (Optional[Mapping[str, Primitive]]): The timing of
+                every component it may instantiate; PRIMITIVES by default.
+        """
+        self.component = component
+        self.primitives = primitives if primitives is not None else PRIMITIVES
+        self.graph = component.graph
+        self.diagnostics: List[Diagnostic] = []
+        self.ports = {port.name: port for port in component.signature.out_ports}
+        # Value name -> the window it is available in, if known
+        self.available: Dict[str, Optional[Window]] = {}
+        self.symbols = component.symbols
+        # Symbols of invokes of components whose timing is not modelled here;
+        # the graph already put every invoke in the table
+        self.opaque: Set[int] = set()
+        # (value, window needed, reader, command) for every value read
+        self.reads = []
+
+    def report(self, message: str, *commands: Command):
+        # An invoke passing the same value twice would repeat itself
+        if all(message != diagnostic.message for diagnostic in self.diagnostics[-2:]):
+            self.diagnostics.append(Diagnostic(message, list(commands)))
+
+    def check_range(self, what: str, range_: Range, *commands: Command) -> Optional[Window]:
+        span = window(range_)
+        if span is not None and definitely_before(span[1], span[0]):
+            self.report(f"{what} has an inverted range <{range_}>", *commands)
+            return None
+        return span
+
+    def check_read(self, name: str, need: Optional[Window], reader: str, cmd: Command):
+        """
+        Check a value is defined and available for the whole of `need`.
+        """
+        if name not in self.available:
+            # A lookup only, so checking never adds names to the table
+            if self.symbols.get(name.partition(".")[0]) not in self.opaque:
+                self.report(f"{reader} reads unknown name {name}", cmd)
+            return
+        have = self.available[name]
+        if need is None or have is None:
+            return
+        if definitely_before(need[0], have[0]) or definitely_before(have[1], need[1]):
+            self.report(
+                f"{reader} needs {name} during {show(need)} "
+                f"but it is only available during {show(have)}",
+                cmd,
+            )
+
+    def check_invoke(self, cmd: Invoke):
+        """
+        Check the invocation itself, record when its output is available and
+        queue its reads to be checked once every output is known.
+        """
+        span = self.check_range(f"Invoke {cmd.variable}", cmd.range_, cmd)
+        instance = self.graph.instance(cmd)
+        if instance is None:
+            self.report(f"Invoke {cmd.variable} uses unknown instance {cmd.function}", cmd)
+            self.opaque.add(self.symbols.get(cmd.variable))
+            return
+        primitive = self.primitives.get(instance.type_name)
+        if primitive is None:
+            # Not a primitive, so its ports and timing are unknown here
+            self.opaque.add(self.symbols.get(cmd.variable))
+            self.reads.extend((arg, None, f"Invoke {cmd.variable}", cmd) for arg in cmd.ports)
+            return
+        if len(cmd.range_) != primitive.events:
+            self.report(
+                f"Invoke {cmd.variable} gives {instance.type_name} {len(cmd.range_)} "
+                f"event(s) but it takes {primitive.events}",
+                cmd,
+            )
+            span = None
+        if len(cmd.ports) != len(primitive.inputs):
+            self.report(
+                f"Invoke {cmd.variable} passes {len(cmd.ports)} argument(s) to "
+                f"{instance.type_name}, which has {len(primitive.inputs)} input(s)",
+                cmd,
+            )
+
+        start = span[0] if span is not None else None
+        for name, (lo, hi) in primitive.outputs.items():
+            output = None
+            if start is not None:
+                end = span[1] if hi is None else shift(start, hi)
+                output = (shift(start, lo), end)
+            self.available[f"{cmd.variable}.{name}"] = output
+        for position, arg in enumerate(cmd.ports):
+            need = None
+            if start is not None and position < len(primitive.inputs):
+                lo, hi = primitive.port_needs[primitive.inputs[position]]
+                need = (shift(start, lo), shift(start, hi))
+            self.reads.append((arg, need, f"Invoke {cmd.variable}", cmd))
+
+    def check_connect(self, cmd: Connect):
+        dest = self.ports.get(cmd.dest)
+        node = self.graph.resolve(self.graph.connect_refs(cmd)[1][0])
+        if dest is None and (node is None or self.graph.kinds[node] is not NodeKind.INVOKE):
+            self.report(f"Connection writes unknown name {cmd.dest}", cmd)
+        need = window(dest.range_) if dest is not None else None
+        self.reads.append((cmd.src, need, f"Output {cmd.dest}", cmd))
+
+    def run(self) -> List[Diagnostic]:
+        signature = self.component.signature
+        for port in signature.in_ports:
+            self.available[port.name] = self.check_range(f"Port {port.name}", port.range_)
+        for port in signature.out_ports:
+            self.check_range(f"Port {port.name}", port.range_)
+
+        for cmd in self.component.commands:
+            if isinstance(cmd, Invoke):
+                self.check_invoke(cmd)
+            elif isinstance(cmd, Connect):
+                self.check_connect(cmd)
+        for read in self.reads:
+            self.check_read(*read)
+        self.check_resources()
+        self.check_cycles()
+        return self.diagnostics
+
+    def check_cycles(self):
+        cycle = self.graph.find_cycle()
+        if cycle is not None:
+            names = " -> ".join(self.graph.names[node] for node in cycle + cycle[:1])
+            commands = [self.graph.commands[node] for node in cycle if self.graph.commands[node]]
+            self.report(f"Dataflow cycle: {names}", *commands)
+
+    def check_resources(self):
+        """
+        Check no instance is used by overlapping invokes, and the declared
+        event delay leaves room for every instance to be reused.
+        """
+        index = InvokeIndex(self.component)
+        for first, second, lo, hi in index.conflicts():
+            self.report(
+                f"Invokes {first.variable} and {second.variable} both use "
+                f"{first.function} during cycles [{lo}, {hi})",
+                first,
+                second,
+            )
+        delay = index.declared_delay()
+        if delay is not None and delay < index.initiation_interval():
+            self.report(
+                f"Event delay {delay} is shorter than the initiation interval "
+                f"{index.initiation_interval()} its instances need"
+            )
+
+
+def precheck(
+    component: Component, primitives: Optional[Mapping[str, Primitive]] = None
+) -> List[Diagnostic]:
+    """
+    Find timing and naming errors that need no solver, in time linear in the
+    size of the component apart from sorting each instance's uses.
+    """
+    return Prechecker(component, primitives).run()
+
+
+def explain_unsat(component: Component) -> List[Diagnostic]:
+    """
+    Solve the component's constraints with one tracked assertion per command
+    and name the commands in a minimal unsat core. Returns an empty list if
+    the constraints are satisfiable after all.
+    """
+    from z3 import And, Bool, Implies, Solver, unsat
+    from pyfilament.z3_solver import (
+        command_constraints,
+        component_start_times,
+        component_states,
+        fsm_constraints,
+    )
+
+    solver = Solver()
+    solver.set("core.minimize", True)
+    start_times = component_start_times(component)
+    solver.add(fsm_constraints(component_states(component)))
+    # Guard literal -> command; the core is reported in terms of the guards
+    tracked = {}
+    for index, cmd in enumerate(component.commands):
+        constraints = command_constraints(cmd, start_times, component.graph)
+        if constraints:
+            guard = Bool(f"track!{index}")
+            tracked[guard] = cmd
+            solver.add(Implies(guard, And(constraints)))
+
+    if solver.check(*tracked) != unsat:
+        return []
+    commands = [tracked[guard] for guard in solver.unsat_core()]
+    commands.sort(key=component.commands.index)
+    listing = "; ".join(repr(cmd).rstrip(";") for cmd in commands)
+    return [Diagnostic(f"Conflicting commands: {listing}", commands)]
@@ -5,6 +5,8 @@ from pyfilament.event import Range
 
 
 class Command:
+    __slots__ = ()
+
     def __init__(self):
         pass
 
@@ -13,6 +15,8 @@ class Command:
 
 
 class Instance(Command):
+    __slots__ = ("variable", "type_name", "size")
+
     def __init__(self, variable: str, type_name: str, size: Optional[int]):
         """
         Represent an (instantiate) command.
@@ -44,6 +48,8 @@ class Instance(Command):
 
 
 class Invoke(Command):
+    __slots__ = ("variable", "function", "range_", "ports", "lower")
+
     def __init__(self, variable: str, function: str, range_: Range, ports: List[str]):
         """
         Represent an (invoke) command.
@@ -88,6 +94,8 @@ class Invoke(Command):
 
 
 class Connect(Command):
+    __slots__ = ("dest", "src", "guard")
+
     def __init__(self, dest: str, src: str, guard: Optional[str] = None):
         """
         Represent a (connect) command.
@@ -0,0 +1,299 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from typing import Dict, Iterable, List, Optional
+
+from pyfilament import metrics
+from pyfilament.cache import default_cache
+from pyfilament.check import TimingError, explain_unsat, precheck
+from pyfilament.component import Component
+from pyfilament.lower import generate_lower
+from pyfilament.parse import iter_file, parse
+from pyfilament.registry import Registry, Summary, callee_context, primitives_with
+from pyfilament.sexpr import SExpr
+
+
+class CompileResult:
+    def __init__(
+        self,
+        path: str,
+        index: Optional[int],
+        name: Optional[str],
+        schedule: Optional[dict] = None,
+        lowered: Optional[str] = None,
+        error: Optional[str] = None,
+        metrics: Optional[dict] = None,
+        timed_out: bool = False,
+    ):
+        """
+        The outcome of compiling one component of a file.
+
+        Args:
+            path (str): The file the component came from.
+            index (Optional[int]): Position of the component in the file, or
+                None if the file itself could not be read or parsed.
+            name (Optional[str]): The component name.
+            schedule (Optional[dict]): The solved start times and FSM states.
+            lowered (Optional[str]): The lowered Filament text.
+            error (Optional[str]): Why compilation failed, if it did.
+            metrics (Optional[dict]): Measurements taken while compiling, in
+                the form of Metrics.as_dict, if they were requested.
+            timed_out (bool): Whether compilation failed by running out of
+                time or solver resources.
+        """
+        self.path = path
+        self.index = index
+        self.name = name
+        self.schedule = schedule
+        self.lowered = lowered
+        self.error = error
+        self.metrics = metrics
+        self.timed_out = timed_out
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def solver(self) -> Optional[str]:
+        """
+        The portfolio configuration that solved the component, if it was
+        solved by a portfolio race, for tuning the portfolio.
+        """
+        return self.schedule.get("solver") if self.schedule else None
+
+    def __repr__(self):
+        where = f"{self.path}[{self.index}] {self.name}" if self.index is not None else self.path
+        status = "ok" if self.ok else f"error: {self.error}"
+        return f"CompileResult({where}: {status})"
+
+
+def describe_error(err: BaseException) -> str:
+    return f"{err.__class__.__name__}: {err}"
+
+
+def compile_expr(
+    expr: SExpr,
+    use_cache: bool = True,
+    timeout: Optional[int] = None,
+    rlimit: Optional[int] = None,
+    portfolio: bool = False,
+    callees: Optional[Dict[str, Summary]] = None,
+):
+    """
+    Run a single component through elaboration, constraint solving and
+    lowering.
+
+    Returns the solved schedule and the lowered Filament text; with
+    `portfolio`, the schedule also names the winning configuration under
+    "solver". Raises TimingError, naming the commands responsible, if a
+    precheck fails or the timing constraints are unsatisfiable, and
+    SolverTimeout if the solver hits its time or resource limit.
+
+    Args:
+        expr (SExpr): The component definition.
+        use_cache (bool): Look the component up in, and store it to, the
+            on-disk compilation cache.
+        timeout (Optional[int]): Milliseconds the solver may spend per query.
+        rlimit (Optional[int]): Solver resource limit per query.
+        portfolio (bool): Race several solver configurations in parallel
+            processes instead of using a single z3 solver.
+        callees (Optional[Dict[str, Summary]]): The user-defined components
+            it instantiates, by name.
+    """
+    primitives = primitives_with(callees)
+    if use_cache:
+        cache = default_cache()
+        key = cache.key(expr, callee_context(callees))
+        with metrics.stage("cache"):
+            entry = cache.get(key)
+        if entry is not None:
+            metrics.count("cache_hits")
+            return entry["schedule"], entry["lowered"]
+        metrics.count("cache_misses")
+
+    from pyfilament.z3_solver import solve_component_constraints
+
+    with metrics.stage("elaborate"):
+        comp = Component.from_sexpr(expr)
+    with metrics.stage("check"):
+        diagnostics = precheck(comp, primitives)
+    if diagnostics:
+        raise TimingError("Timing check failed", diagnostics)
+    with metrics.stage("solve"):
+        if portfolio:
+            from pyfilament.portfolio import solve_component_portfolio
+
+            schedule, solver = solve_component_portfolio(expr, comp, timeout=timeout)
+            if schedule is not None:
+                # Kept with the schedule, so it also survives the cache
+                schedule["solver"] = solver
+        else:
+            schedule = solve_component_constraints(
+                comp, timeout=timeout, rlimit=rlimit, use_cache=use_cache
+            )
+    if schedule is None:
+        raise TimingError("Timing constraints are unsatisfiable", explain_unsat(comp))
+    with metrics.stage("lower"):
+        lowered = repr(generate_lower(comp, primitives))
+
+    if use_cache:
+        cache.put(key, {"schedule": schedule, "lowered": lowered})
+    return schedule, lowered
+
+
+def compile_source(
+    path: str,
+    index: int,
+    source: str,
+    use_cache: bool = True,
+    collect_metrics: bool = False,
+    portfolio: bool = False,
+    callees: Optional[Dict[str, Summary]] = None,
+) -> CompileResult:
+    """
+    Compile the text of one component, capturing any error in the result.
+    """
+    result = CompileResult(path, index, None)
+    # The caller already parsed (and measured parsing) this source once
+    try:
+        expr = parse(source)[0]
+        result.name = expr["comp"]
+    except Exception as err:
+        result.error = describe_error(err)
+        return result
+
+    collector = metrics.collect() if collect_metrics else nullcontext()
+    with collector as measured:
+        try:
+            result.schedule, result.lowered = compile_expr(
+                expr, use_cache, portfolio=portfolio, callees=callees
+            )
+        except Exception as err:
+            result.error = describe_error(err)
+    if measured is not None:
+        result.metrics = measured.as_dict()
+    return result
+
+
+def expand_paths(patterns: Iterable[str]) -> List[str]:
+    """
+    Expand files, directories (all .fil files below them) and glob patterns
+    into a sorted, de-duplicated list of paths.
+    """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(glob.glob(os.path.join(pattern, "**", "*.fil"), recursive=True))
+        elif glob.has_magic(pattern):
+            paths.update(glob.glob(pattern, recursive=True))
+        else:
+            paths.add(pattern)
+    return sorted(paths)
+
+
+def compile_task(path: str, index: int, source: str, callees, **options) -> CompileResult:
+    return compile_source(path, index, source, callees=callees, **options)
+
+
+def compile_files(
+    patterns: Iterable[str],
+    jobs: Optional[int] = None,
+    use_cache: bool = True,
+    collect_metrics: bool = False,
+    portfolio: bool = False,
+) -> List[CompileResult]:
+    """
+    Compile every component of every matching file.
+
+    Components are compiled in parallel on a process pool, since solving is
+    CPU-bound. A component may instantiate others defined in the same file;
+    each file's call graph is compiled bottom-up, one level at a time, and
+    callers are checked against the timing of their callees. Results come
+    back in file order and then component order, and a failing component is
+    reported in its result, and in those of its callers, without stopping
+    the batch.
+
+    Args:
+        patterns (Iterable[str]): Files, directories or glob patterns.
+        jobs (Optional[int]): Number of worker processes; defaults to the CPU
+            count, and 1 compiles everything in this process.
+        use_cache (bool): Consult the on-disk compilation cache.
+        collect_metrics (bool): Attach per-component measurements to each
+            result, including for components compiled in worker processes.
+        portfolio (bool): Solve each component with a portfolio race.
+    """
+    # One entry per component to compile, or a result for one that failed
+    # before compiling
+    entries = []
+    # (path, component name) -> its entry
+    tasks: Dict[tuple, tuple] = {}
+    registries: Dict[str, Registry] = {}
+    with metrics.stage("parse"):
+        for path in expand_paths(patterns):
+            registry = registries[path] = Registry()
+            try:
+                for index, expr in enumerate(iter_file(path)):
+                    try:
+                        name = registry.register(expr)
+                    except RuntimeError as err:
+                        entries.append(
+                            CompileResult(path, index, expr["comp"], error=describe_error(err))
+                        )
+                        continue
+                    entries.append((path, index, str(expr)))
+                    tasks[(path, name)] = entries[-1]
+            except (OSError, RuntimeError) as err:
+                entries.append(CompileResult(path, None, None, error=describe_error(err)))
+
+    # levels[i] holds the components that only instantiate components of
+    # levels before i, across all files
+    levels: List[List[tuple]] = []
+    results: Dict[tuple, CompileResult] = {}
+    for path, registry in registries.items():
+        try:
+            file_levels = registry.levels()
+        except RuntimeError as err:
+            for name in registry.exprs:
+                path, index, _ = tasks[(path, name)]
+                results[(path, name)] = CompileResult(path, index, name, error=describe_error(err))
+            continue
+        for depth, names in enumerate(file_levels):
+            if depth == len(levels):
+                levels.append([])
+            levels[depth].extend((path, name) for name in names)
+
+    options = dict(use_cache=use_cache, collect_metrics=collect_metrics, portfolio=portfolio)
+    parallel = jobs != 1 and len(tasks) > 1
+    workers = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) if parallel else nullcontext() as pool:
+        for level in levels:
+            ready = []
+            for path, name in level:
+                registry = registries[path]
+                failed = [
+                    callee
+                    for callee in registry.callees(name)
+                    if not results[(path, callee)].ok
+                ]
+                if failed:
+                    _, index, _ = tasks[(path, name)]
+                    err = RuntimeError(f"Instantiates {', '.join(failed)}, which failed to compile")
+                    results[(path, name)] = CompileResult(path, index, name, error=describe_error(err))
+                else:
+                    ready.append((path, name))
+
+            args = [(*tasks[key], registries[key[0]].callee_summaries(key[1])) for key in ready]
+            if pool is None or len(args) <= 1:
+                compiled = [compile_task(*arg, **options) for arg in args]
+            else:
+                chunksize = max(1, len(args) // (workers * 4))
+                compiled = list(
+                    pool.map(partial(compile_task, **options), *zip(*args), chunksize=chunksize)
+                )
+            results.update(zip(ready, compiled))
+
+    by_entry = {id(tasks[key]): result for key, result in results.items()}
+    return [by_entry[id(entry)] if isinstance(entry, tuple) else entry for entry in entries]
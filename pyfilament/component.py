@@ -2,13 +2,17 @@ from typing import List
 
 from pyfilament.signature import Signature
 from pyfilament.command import Command, Instance, Invoke, Connect
+from pyfilament.graph import DataflowGraph
 from pyfilament.sexpr import SExpr
+from pyfilament.symbols import SymbolTable
 
 
 class Component:
     def __init__(self, signature: "Signature", commands: List[Command]):
         self.signature = signature
         self.commands = commands
+        self.symbols = SymbolTable()
+        self.graph = DataflowGraph(signature, commands, self.symbols)
 
     def __repr__(self):
         commands_str = "\n  ".join(repr(cmd) for cmd in self.commands)
@@ -25,3 +29,23 @@ class Component:
         for command in expr["connect"]:
             commands.append(Connect.from_sexpr(command))
         return Component(signature, commands)
+
+    def dump(self, path: str):
+        """
+        Write the component to `path` in the binary IR format.
+        """
+        from pyfilament import ir
+
+        ir.dump([self], path)
+
+    @staticmethod
+    def load(path: str, use_mmap: bool = False) -> "Component":
+        """
+        Read a component written by dump.
+        """
+        from pyfilament import ir
+
+        components = ir.load(path, use_mmap)
+        if len(components) != 1:
+            raise RuntimeError(f"{path} holds {len(components)} components, expected 1")
+        return components[0]
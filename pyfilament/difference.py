@@ -0,0 +1,166 @@
+from collections import deque
+from typing import Dict, List, Optional, Tuple, Union
+
+from pyfilament import metrics
+from pyfilament.command import Instance, Invoke, Connect
+from pyfilament.component import Component
+from pyfilament.event import Event
+
+# A variable: an event name, or the symbol of a command whose start time it is
+Var = Union[str, int]
+
+# A timing term `var + offset`; var is None for a constant
+Term = Tuple[Optional[Var], int]
+
+# Name of the node standing for the constant 0 in the constraint graph
+ZERO = ""
+
+
+class NotDifferenceLogic(Exception):
+    """
+    Raised when a constraint cannot be written as `x - y <= c`.
+    """
+
+
+def event_term(event: Event) -> Term:
+    """
+    The `var + offset` form of an event, e.g. (+ G 3) -> ("G", 3).
+    """
+    linear = event.linear
+    if linear is None or (linear.terms and linear.var is None):
+        raise NotDifferenceLogic(f"Not a difference term: {event}")
+    return linear.var, linear.offset
+
+
+class DifferenceSystem:
+    def __init__(self):
+        """
+        A conjunction of difference constraints `x - y <= c` over integer
+        variables, with ZERO standing for the constant 0.
+        """
+        self.ids: Dict[Var, int] = {ZERO: 0}
+        self.names: List[Var] = [ZERO]
+        self.edges: List[List[Tuple[int, int]]] = [[]]
+
+    def var(self, name: Var) -> int:
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.edges.append([])
+        return self.ids[name]
+
+    def add_le(self, lhs: Term, rhs: Term):
+        """
+        Add the constraint lhs <= rhs.
+        """
+        lhs_var, lhs_off = lhs
+        rhs_var, rhs_off = rhs
+        # lhs_var - rhs_var <= rhs_off - lhs_off, stored as an edge
+        # lhs_var -> rhs_var in the transposed constraint graph
+        x = self.var(lhs_var if lhs_var is not None else ZERO)
+        y = self.var(rhs_var if rhs_var is not None else ZERO)
+        self.edges[x].append((y, rhs_off - lhs_off))
+
+    def add_eq(self, lhs: Term, rhs: Term):
+        self.add_le(lhs, rhs)
+        self.add_le(rhs, lhs)
+
+    def solve(self) -> Optional[Dict[Var, int]]:
+        """
+        Find the least non-negative solution with SPFA (queue-based
+        Bellman-Ford), shifted so that ZERO is 0. Returns None when the
+        system is unsatisfiable, i.e. the graph has a negative cycle.
+        """
+        n = len(self.names)
+        # Every node starts at distance 0 from an implicit virtual source, so
+        # no shortest path has more than n edges unless there is a negative cycle
+        dist = [0] * n
+        length = [1] * n
+        queue = deque(range(n))
+        queued = [True] * n
+
+        while queue:
+            u = queue.popleft()
+            queued[u] = False
+            du = dist[u]
+            for v, weight in self.edges[u]:
+                if du + weight < dist[v]:
+                    dist[v] = du + weight
+                    length[v] = length[u] + 1
+                    if length[v] > n:
+                        return None
+                    if not queued[v]:
+                        queued[v] = True
+                        queue.append(v)
+
+        # Distances in the transposed graph are the negated least solution
+        zero = dist[0]
+        return {name: zero - dist[i] for i, name in enumerate(self.names) if name != ZERO}
+
+
+def solve_difference_constraints(component: Component):
+    """
+    Solve the timing constraints of a component without z3, when all of them
+    are difference constraints.
+
+    Returns the same dictionary as `solve_component_constraints`, or None if
+    the constraints are unsatisfiable. Raises NotDifferenceLogic if some
+    constraint is outside the fragment.
+    """
+    system = DifferenceSystem()
+    graph = component.graph
+    symbols = component.symbols
+    # Symbol -> start time; a command's start time is a variable of its own
+    start_times: Dict[int, Term] = {}
+    for cmd in component.commands:
+        if hasattr(cmd, "variable"):
+            sym = graph.symbol(cmd)
+            start_times[sym] = (sym, 0)
+    for port in component.signature.in_ports:
+        start_times[symbols.get(port.name)] = event_term(port.range_.lo)
+    for port in component.signature.out_ports:
+        start_times[symbols.get(port.name)] = event_term(port.range_.lo)
+
+    system.add_eq(("G", 0), (None, 0))
+    for cmd in component.commands:
+        if isinstance(cmd, Instance):
+            system.add_le((None, 0), start_times[graph.symbol(cmd)])
+
+        elif isinstance(cmd, Invoke):
+            start = start_times[graph.symbol(cmd)]
+            if len(cmd.range_) == 1:
+                system.add_eq(start, event_term(cmd.range_.lo))
+            elif len(cmd.range_) == 2:
+                system.add_le(event_term(cmd.range_.lo), start)
+                system.add_le(start, event_term(cmd.range_.hi))
+            else:
+                raise RuntimeError(
+                    f"Too many timing constraints in invocation - {cmd}: {cmd.range_}"
+                )
+
+        elif isinstance(cmd, Connect):
+            src, dest = graph.connect_refs(cmd)
+            src_start_time = start_times.get(src[0], None)
+            dest_start_time = start_times.get(dest[0], None)
+            if src_start_time is None:
+                raise RuntimeError(f"Missing start time for variable {cmd.src}")
+            elif dest_start_time is None:
+                raise RuntimeError(f"Missing start time for variable {cmd.dest}")
+            system.add_le(src_start_time, dest_start_time)
+
+    if metrics.active is not None:
+        metrics.count("difference_constraints", sum(len(edges) for edges in system.edges))
+    with metrics.stage("solve.difference"):
+        solution = system.solve()
+    if solution is None:
+        return None
+
+    fsm_states = component.signature.event[0][1]
+    return {
+        "start_times": {
+            symbols.names[sym]: solution.get(var, 0) + offset
+            for sym, (var, offset) in start_times.items()
+        },
+        # Keeping every state active satisfies the FSM transition constraints
+        "states": {f"{fsm_states}_{i}": 1 for i in range(4)},
+    }
@@ -1,9 +1,113 @@
-from typing import Optional
+import weakref
+from typing import Dict, Optional, Tuple
 
-from pyfilament.sexpr import SExpr, eval_expr
+from pyfilament.sexpr import SExpr, eval_expr, hashcons
+
+
+class Affine:
+    __slots__ = ("terms", "const")
+
+    def __init__(self, terms: Tuple[Tuple[str, int], ...], const: int):
+        """
+        A linear combination of event variables plus a constant offset.
+
+        Args:
+            terms (Tuple[Tuple[str, int], ...]): (variable, coefficient) pairs
+                sorted by variable, with no zero coefficients.
+            const (int): The constant offset.
+        """
+        self.terms = terms
+        self.const = const
+
+    @staticmethod
+    def of(coeffs: Dict[str, int], const: int) -> "Affine":
+        return Affine(tuple(sorted((v, c) for v, c in coeffs.items() if c != 0)), const)
+
+    @staticmethod
+    def from_expr(expr: str | SExpr) -> Optional["Affine"]:
+        """
+        Normalize an arithmetic expression, or return None if it is not affine
+        (a product of two variables, or any division).
+        """
+        if isinstance(expr, str):
+            if expr.isdecimal():
+                return Affine((), int(expr))
+            if len(expr) > 0 and expr[0].isalpha():
+                return Affine(((expr, 1),), 0)
+            raise RuntimeError(f"Unable to evaluate {expr} as arithmetic expression")
+        if len(expr) == 1:
+            return Affine.from_expr(expr[0])
+        if len(expr) != 3:
+            raise RuntimeError(f"Invalid arithmetic expression: {expr}")
+        lhs, rhs = Affine.from_expr(expr[1]), Affine.from_expr(expr[2])
+        if lhs is None or rhs is None:
+            return None
+        if expr[0] == "+":
+            return lhs + rhs
+        if expr[0] == "-":
+            return lhs - rhs
+        if expr[0] == "*":
+            if not lhs.terms:
+                return rhs.scale(lhs.const)
+            if not rhs.terms:
+                return lhs.scale(rhs.const)
+            return None
+        if expr[0] == "/":
+            return None
+        raise RuntimeError(f"Invalid arithmetic expression: {expr}")
+
+    def __add__(self, other: "Affine") -> "Affine":
+        coeffs = dict(self.terms)
+        for var, coeff in other.terms:
+            coeffs[var] = coeffs.get(var, 0) + coeff
+        return Affine.of(coeffs, self.const + other.const)
+
+    def __sub__(self, other: "Affine") -> "Affine":
+        return self + other.scale(-1)
+
+    def scale(self, factor: int) -> "Affine":
+        return Affine.of({var: coeff * factor for var, coeff in self.terms}, self.const * factor)
+
+    @property
+    def var(self) -> Optional[str]:
+        """
+        The event variable, if this is of the form `var + offset`.
+        """
+        if len(self.terms) == 1 and self.terms[0][1] == 1:
+            return self.terms[0][0]
+        return None
+
+    @property
+    def offset(self) -> int:
+        return self.const
+
+    def eval(self, bindings: Optional[Dict[str, int]] = None) -> int:
+        """
+        Evaluate with the given event variable values; unbound events are 0.
+        """
+        bindings = bindings or {}
+        return self.const + sum(coeff * bindings.get(var, 0) for var, coeff in self.terms)
+
+    def __eq__(self, other):
+        return isinstance(other, Affine) and self.terms == other.terms and self.const == other.const
+
+    def __hash__(self):
+        return hash((self.terms, self.const))
+
+    def __repr__(self):
+        parts = [var if coeff == 1 else f"{coeff}*{var}" for var, coeff in self.terms]
+        if self.const or not parts:
+            parts.append(str(self.const))
+        return "+".join(parts)
+
+
+# Marks a derived form that has not been computed yet
+_UNSET = object()
 
 
 class Range:
+    __slots__ = ("lo", "hi")
+
     def __init__(self, lo: str | SExpr, hi: Optional[str | SExpr] = None):
         self.lo = Event(lo)
         if hi is not None:
@@ -17,6 +121,17 @@ class Range:
         else:
             return 2
 
+    def cycles(self) -> int:
+        """
+        Number of cycles the range covers; a single event covers one.
+        """
+        if self.hi is None:
+            return 1
+        span = self.hi.linear - self.lo.linear
+        if span.terms:
+            raise RuntimeError(f"Range {self} does not have a constant length")
+        return span.const
+
     def __repr__(self):
         if self.hi is not None:
             return f"{self.lo},{self.hi}"
@@ -25,18 +140,59 @@ class Range:
 
 
 class Event:
-    def __init__(self, expr: str | SExpr):
-        self.expr = expr
+    """
+    A timing expression. Events are hash-consed: constructing an Event from
+    an expression structurally equal to an earlier one returns the same
+    object, so its derived forms are computed at most once.
+    """
+
+    __slots__ = ("expr", "_arithmetic", "_constraint", "_linear", "__weakref__")
+
+    # Held weakly, like the hash-consed expressions themselves
+    _table: "weakref.WeakValueDictionary[SExpr, Event]" = weakref.WeakValueDictionary()
+
+    def __new__(cls, expr: str | SExpr):
+        expr = hashcons(expr)
+        event = cls._table.get(expr)
+        if event is None:
+            event = super().__new__(cls)
+            event.expr = expr
+            event._arithmetic = None
+            event._constraint = None
+            event._linear = _UNSET
+            cls._table[expr] = event
+        return event
+
+    def __getnewargs__(self):
+        # Unpickling goes back through __new__, so events stay hash-consed
+        return (self.expr,)
+
+    @property
+    def linear(self) -> Optional[Affine]:
+        """
+        The normalized affine form of the event, or None if it is not affine.
+        """
+        if self._linear is _UNSET:
+            self._linear = Affine.from_expr(self.expr)
+        return self._linear
 
     def eval_constraint(self):
-        return eval_expr(self.expr)
+        if self._constraint is None:
+            self._constraint = eval_expr(self.expr)
+        return self._constraint
 
-    def eval_event(self) -> int:
-        G = 0
-        return eval(self.convert())
+    def eval_event(self, bindings: Optional[Dict[str, int]] = None) -> int:
+        """
+        The concrete cycle of the event, taking unbound event variables as 0.
+        """
+        if self.linear is None:
+            raise RuntimeError(f"Event {self} is not an affine expression")
+        return self.linear.eval(bindings)
 
     def convert(self):
-        return self.expr.arithmetic() if isinstance(self.expr, SExpr) else self.expr
+        if self._arithmetic is None:
+            self._arithmetic = self.expr.arithmetic() if isinstance(self.expr, SExpr) else self.expr
+        return self._arithmetic
 
     def __repr__(self):
         return f"{self.convert()}"
@@ -0,0 +1,221 @@
+"""
+The dataflow graph of a component's commands.
+
+Nodes are numbered densely: first the signature ports, then one node per
+command in program order. Edges point from producers to consumers: instance
+-> invoke of it, value source -> invoke or connect reading it, and connect
+-> the port or invoke it writes. Port names like `a0.out` are resolved to
+their nodes once, when the graph is built, through the component's symbol
+table, so the graph itself joins on integer symbol ids.
+"""
+from collections import deque
+from enum import Enum
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from pyfilament.command import Command, Connect, Instance, Invoke
+from pyfilament.symbols import Ref, SymbolTable
+
+if TYPE_CHECKING:
+    from pyfilament.signature import Signature
+
+
+class NodeKind(Enum):
+    IN_PORT = 0
+    OUT_PORT = 1
+    INSTANCE = 2
+    INVOKE = 3
+    CONNECT = 4
+    OTHER = 5
+
+
+class DataflowGraph:
+    def __init__(
+        self,
+        signature: "Signature",
+        commands: List[Command],
+        symbols: Optional[SymbolTable] = None,
+    ):
+        """
+        Build the graph of a component.
+
+        Args:
+            signature (Signature): The component signature, for its ports.
+            commands (List[Command]): The component's commands.
+            symbols (Optional[SymbolTable]): The component's symbol table;
+                a new one by default.
+        """
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.names: List[str] = []
+        self.kinds: List[NodeKind] = []
+        self.commands: List[Optional[Command]] = []
+        self.succ: List[List[int]] = []
+        self.pred: List[List[int]] = []
+        # Symbol of a port, instance or invoke -> its node, or -1 for other
+        # symbols
+        self.defs: List[int] = []
+        # Command -> its node
+        self.nodes: Dict[Command, int] = {}
+        # Connect -> its source and destination as (instance, port) symbols,
+        # flattened into one tuple
+        self.refs: Dict[Connect, Tuple[int, int, int, int]] = {}
+        # Invoke -> the Instance it invokes, if the component defines it
+        self.instances: Dict[Invoke, Instance] = {}
+        self.unresolved: List[Tuple[int, str]] = []
+        self._order = None
+
+        if signature is not None:
+            for port in signature.in_ports:
+                self.define(port.name, self.add_node(port.name, NodeKind.IN_PORT))
+            for port in signature.out_ports:
+                self.define(port.name, self.add_node(port.name, NodeKind.OUT_PORT))
+
+        for cmd in commands:
+            if isinstance(cmd, Instance):
+                node = self.add_node(cmd.variable, NodeKind.INSTANCE, cmd)
+                self.define(cmd.variable, node)
+            elif isinstance(cmd, Invoke):
+                node = self.add_node(cmd.variable, NodeKind.INVOKE, cmd)
+                self.define(cmd.variable, node)
+            elif isinstance(cmd, Connect):
+                node = self.add_node(cmd.dest, NodeKind.CONNECT, cmd)
+            else:
+                node = self.add_node(cmd.__class__.__name__, NodeKind.OTHER, cmd)
+            self.nodes[cmd] = node
+
+        # Edges need every name defined first, since commands may refer to
+        # names defined after them
+        for cmd in commands:
+            node = self.nodes[cmd]
+            if isinstance(cmd, Invoke):
+                instance = self.lookup(cmd.function)
+                if instance is not None and self.kinds[instance] is NodeKind.INSTANCE:
+                    self.instances[cmd] = self.commands[instance]
+                    self.add_edge(instance, node)
+                else:
+                    self.unresolved.append((node, cmd.function))
+                for port in cmd.ports:
+                    self.link(port, node, incoming=True)
+            elif isinstance(cmd, Connect):
+                src = self.link(cmd.src, node, incoming=True)
+                dest = self.link(cmd.dest, node, incoming=False)
+                self.refs[cmd] = src + dest
+
+    def add_node(self, name: str, kind: NodeKind, cmd: Optional[Command] = None) -> int:
+        self.names.append(name)
+        self.kinds.append(kind)
+        self.commands.append(cmd)
+        self.succ.append([])
+        self.pred.append([])
+        return len(self.names) - 1
+
+    def add_edge(self, src: int, dest: int):
+        self.succ[src].append(dest)
+        self.pred[dest].append(src)
+
+    def define(self, name: str, node: int):
+        sym = self.symbols.intern(name)
+        if sym >= len(self.defs):
+            self.defs.extend([-1] * (sym + 1 - len(self.defs)))
+        self.defs[sym] = node
+
+    def resolve(self, sym: int) -> Optional[int]:
+        node = self.defs[sym] if sym < len(self.defs) else -1
+        return node if node >= 0 else None
+
+    def lookup(self, name: str) -> Optional[int]:
+        """
+        The node a port, instance or invoke name refers to, if any.
+        """
+        sym = self.symbols.get(name)
+        return self.resolve(sym) if sym is not None else None
+
+    def link(self, name: str, node: int, incoming: bool) -> Ref:
+        """
+        Connect `node` to the node `name` refers to, and return `name` as an
+        (instance, port) reference.
+        """
+        ref = self.symbols.ref(name)
+        other = self.resolve(ref[0])
+        if other is None:
+            self.unresolved.append((node, name))
+        elif incoming:
+            self.add_edge(other, node)
+        else:
+            self.add_edge(node, other)
+        return ref
+
+    def __len__(self):
+        return len(self.names)
+
+    def node(self, cmd: Command) -> int:
+        return self.nodes[cmd]
+
+    def instance(self, invoke: Invoke) -> Optional[Instance]:
+        """
+        The instance an invoke uses, if the component defines it.
+        """
+        return self.instances.get(invoke)
+
+    def symbol(self, cmd: Command) -> int:
+        """
+        The symbol of an instance or invoke variable, which the graph
+        defined when it was built.
+        """
+        return self.symbols.ids[cmd.variable]
+
+    def connect_refs(self, connect: Connect) -> Tuple[Ref, Ref]:
+        """
+        The source and destination of a connection as (instance, port)
+        symbol pairs.
+        """
+        refs = self.refs[connect]
+        return refs[:2], refs[2:]
+
+    def topological_order(self) -> Optional[List[int]]:
+        """
+        The nodes with every producer before its consumers, or None if the
+        graph has a cycle. Ties keep program order.
+        """
+        if self._order is None:
+            indegree = [len(preds) for preds in self.pred]
+            ready = deque(node for node, degree in enumerate(indegree) if degree == 0)
+            order = []
+            while ready:
+                node = ready.popleft()
+                order.append(node)
+                for succ in self.succ[node]:
+                    indegree[succ] -= 1
+                    if indegree[succ] == 0:
+                        ready.append(succ)
+            self._order = order if len(order) == len(self) else False
+        return self._order if self._order is not False else None
+
+    def find_cycle(self) -> Optional[List[int]]:
+        """
+        The nodes of some cycle in the graph, in order, or None if it is acyclic.
+        """
+        if self.topological_order() is not None:
+            return None
+        # Iterative DFS; a back edge to a node on the stack closes a cycle
+        state = [0] * len(self)  # 0 unvisited, 1 on the stack, 2 done
+        for root in range(len(self)):
+            if state[root]:
+                continue
+            stack = [(root, iter(self.succ[root]))]
+            path = [root]
+            state[root] = 1
+            while stack:
+                node, successors = stack[-1]
+                for succ in successors:
+                    if state[succ] == 1:
+                        return path[path.index(succ) :]
+                    if state[succ] == 0:
+                        state[succ] = 1
+                        stack.append((succ, iter(self.succ[succ])))
+                        path.append(succ)
+                        break
+                else:
+                    state[node] = 2
+                    stack.pop()
+                    path.pop()
+        return None
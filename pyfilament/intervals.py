@@ -0,0 +1,192 @@
+"""
+Interval indexes over the cycles in which a component's invokes are live.
+
+Every invoke whose range is `G+a .. G+b` occupies its instance during the
+cycles [a, b) of its event G. InvokeIndex groups those intervals per
+instance to find instances used by overlapping invokes, derives the
+pipeline initiation interval and latency of the component, and keeps an
+IntervalTree per event for "what is live at cycle t" queries.
+"""
+import heapq
+from typing import Dict, Generic, Iterator, List, Optional, Tuple, TypeVar
+
+from pyfilament.command import Invoke
+from pyfilament.component import Component
+
+T = TypeVar("T")
+
+# A half-open interval [lo, hi) of cycles and the item occupying it
+Interval = Tuple[int, int, T]
+
+
+class IntervalTree(Generic[T]):
+    __slots__ = ("center", "by_lo", "by_hi", "left", "right")
+
+    def __init__(self, intervals: List[Interval]):
+        """
+        A centered interval tree answering stabbing queries in
+        O(log n + k) time for k results.
+
+        Args:
+            intervals (List[Interval]): The intervals to index; empty ones
+                are never live and are left out.
+        """
+        intervals = [interval for interval in intervals if interval[0] < interval[1]]
+        self.left = self.right = None
+        if not intervals:
+            self.center = 0
+            self.by_lo = self.by_hi = []
+            return
+        starts = sorted(interval[0] for interval in intervals)
+        # The median start lies inside at least one interval, so each level
+        # takes some intervals and halves the rest
+        self.center = center = starts[len(starts) // 2]
+        here, left, right = [], [], []
+        for interval in intervals:
+            if interval[1] <= center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        self.by_lo = sorted(here, key=lambda interval: interval[0])
+        self.by_hi = sorted(here, key=lambda interval: interval[1], reverse=True)
+        if left:
+            self.left = IntervalTree(left)
+        if right:
+            self.right = IntervalTree(right)
+
+    def stab(self, t: int) -> Iterator[T]:
+        """
+        The items whose interval contains cycle `t`.
+        """
+        node = self
+        while node is not None:
+            if t < node.center:
+                for lo, _, item in node.by_lo:
+                    if lo > t:
+                        break
+                    yield item
+                node = node.left
+            elif t > node.center:
+                for _, hi, item in node.by_hi:
+                    if hi <= t:
+                        break
+                    yield item
+                node = node.right
+            else:
+                for _, _, item in node.by_lo:
+                    yield item
+                return
+
+
+def invoke_interval(cmd: Invoke) -> Optional[Tuple[str, int, int]]:
+    """
+    The event and cycles [lo, hi) an invoke occupies its instance for, or
+    None if its range is not of the form `G+a .. G+b` over one event.
+    """
+    lo = cmd.range_.lo.linear
+    hi = cmd.range_.hi.linear if cmd.range_.hi is not None else lo
+    if lo is None or hi is None or lo.var is None or hi.var != lo.var:
+        return None
+    end = hi.offset if cmd.range_.hi is not None else lo.offset + 1
+    return lo.var, lo.offset, end
+
+
+class InvokeIndex:
+    def __init__(self, component: Component):
+        """
+        Index the invokes of a component by instance and by cycle.
+
+        Args:
+            component (Component): The component to index.
+        """
+        self.component = component
+        # (instance, event) -> intervals of the invokes using that instance
+        self.uses: Dict[Tuple[str, str], List[Interval]] = {}
+        # event -> intervals of all invokes scheduled against it
+        by_event: Dict[str, List[Interval]] = {}
+        self.order: Dict[Invoke, int] = {}
+        for position, cmd in enumerate(component.commands):
+            if isinstance(cmd, Invoke):
+                interval = invoke_interval(cmd)
+                if interval is None:
+                    continue
+                event, lo, hi = interval
+                self.order[cmd] = position
+                self.uses.setdefault((cmd.function, event), []).append((lo, hi, cmd))
+                by_event.setdefault(event, []).append((lo, hi, cmd))
+        self.trees = {event: IntervalTree(intervals) for event, intervals in by_event.items()}
+
+    def live(self, t: int, event: Optional[str] = None) -> List[Invoke]:
+        """
+        The invokes live at cycle `t` of `event` (the component's first event
+        by default), in program order.
+        """
+        event = event or self.events()[0]
+        tree = self.trees.get(event)
+        if tree is None:
+            return []
+        return sorted(tree.stab(t), key=self.order.__getitem__)
+
+    def events(self) -> List[str]:
+        return [str(event[1]) for event in self.component.signature.event]
+
+    def conflicts(self) -> List[Tuple[Invoke, Invoke, int, int]]:
+        """
+        Pairs of invokes of the same instance live during the same cycles,
+        with the first and last + 1 cycle of their overlap, found by a sweep
+        over each instance's intervals in O(n log n + k) time.
+        """
+        found = []
+        for intervals in self.uses.values():
+            if len(intervals) < 2:
+                continue
+            active: List[Tuple[int, int, Invoke]] = []
+            for index, (lo, hi, cmd) in enumerate(sorted(intervals, key=lambda i: i[:2])):
+                # Empty and inverted intervals are never live, so overlap nothing
+                if lo >= hi:
+                    continue
+                while active and active[0][0] <= lo:
+                    heapq.heappop(active)
+                for end, _, other in active:
+                    if lo < min(hi, end):
+                        found.append((other, cmd, lo, min(hi, end)))
+                heapq.heappush(active, (hi, index, cmd))
+        return found
+
+    def initiation_interval(self) -> int:
+        """
+        The fewest cycles between successive pipelined invocations of the
+        component: each instance must finish its last use in one invocation
+        before the next invocation's first use of it begins.
+        """
+        interval = 1
+        for intervals in self.uses.values():
+            first = min(lo for lo, _, _ in intervals)
+            last = max(hi for _, hi, _ in intervals)
+            interval = max(interval, last - first)
+        return interval
+
+    def latency(self) -> Optional[int]:
+        """
+        Cycles from the component's event to its last output becoming
+        available, or None if an output is not scheduled against that event.
+        """
+        event = self.events()[0]
+        latency = 0
+        for port in self.component.signature.out_ports:
+            lo = port.range_.lo.linear
+            if lo is None or lo.var != event:
+                return None
+            latency = max(latency, lo.offset)
+        return latency
+
+    def declared_delay(self) -> Optional[int]:
+        """
+        The delay given for the component's event, e.g. 2 for (event G:2).
+        """
+        event = self.component.signature.event[0]
+        if len(event) > 2 and str(event[2]).isdecimal():
+            return int(event[2])
+        return None
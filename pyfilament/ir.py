@@ -0,0 +1,302 @@
+"""
+A compact binary form of elaborated components, before or after lowering.
+
+A file holds any number of components and is laid out as
+
+    header    magic "PFIR", format version, component count
+    strings   every distinct name and atom once, as offsets into a UTF-8 blob
+    exprs     S-expressions (events and event declarations) as a flat int
+              array, children before parents
+    body      signatures and commands as a flat int array of string, expr
+              and range references
+
+Loading rebuilds the objects straight from the integer arrays without
+tokenizing, parsing or elaborating anything. The format holds only data, so
+files are safe to hand to other processes, and large ones can be read
+through mmap.
+"""
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Dict, List, Optional
+
+from pyfilament.command import Command, Connect, Instance, Invoke
+from pyfilament.component import Component
+from pyfilament.event import Range
+from pyfilament.fsm import Fsm
+from pyfilament.port import Direction, InterfacePort, Port
+from pyfilament.sexpr import SExpr
+from pyfilament.signature import Signature
+
+MAGIC = b"PFIR"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHI")
+_LENGTH = struct.Struct("<I")
+
+# References to expressions in the body: 2 * index for a list in the expr
+# table, 2 * string + 1 for an atom, and NONE for a missing one
+NONE = -1
+
+INSTANCE, INVOKE, CONNECT, FSM = range(4)
+
+
+class _Writer:
+    def __init__(self):
+        self.strings: Dict[str, int] = {}
+        self.exprs = array("i")
+        self.expr_count = 0
+        # id(expr) -> reference; events are hash-consed, so this dedupes them
+        self.expr_refs: Dict[int, int] = {}
+        self.body = array("i")
+
+    def string(self, text: Optional[str]) -> int:
+        if text is None:
+            return NONE
+        index = self.strings.get(text)
+        if index is None:
+            index = self.strings[text] = len(self.strings)
+        return index
+
+    def expr(self, expr) -> int:
+        if expr is None:
+            return NONE
+        if isinstance(expr, str):
+            return 2 * self.string(expr) + 1
+        ref = self.expr_refs.get(id(expr))
+        if ref is None:
+            children = [self.expr(item) for item in expr]
+            self.exprs.append(len(children))
+            self.exprs.extend(children)
+            ref = 2 * self.expr_count
+            self.expr_count += 1
+            self.expr_refs[id(expr)] = ref
+        return ref
+
+    def range_(self, range_: Range):
+        self.body.append(self.expr(range_.lo.expr))
+        self.body.append(self.expr(range_.hi.expr if range_.hi is not None else None))
+
+    def port(self, port: Port):
+        self.body.extend((self.string(port.name), port.width))
+        self.range_(port.range_)
+
+    def signature(self, signature: Signature):
+        body = self.body
+        body.append(self.string(signature.name))
+        body.append(self.expr(signature.event))
+        body.append(signature.interface is not None)
+        if signature.interface is not None:
+            self.port(signature.interface)
+        for ports in (signature.in_ports, signature.out_ports):
+            body.append(len(ports))
+            for port in ports:
+                self.port(port)
+
+    def command(self, cmd: Command):
+        body = self.body
+        if isinstance(cmd, Instance):
+            body.extend(
+                (INSTANCE, self.string(cmd.variable), self.string(cmd.type_name), self.string(cmd.size))
+            )
+        elif isinstance(cmd, Invoke):
+            body.extend((INVOKE, self.string(cmd.variable), self.string(cmd.function)))
+            self.range_(cmd.range_)
+            body.extend((int(cmd.lower), len(cmd.ports)))
+            body.extend(self.string(port) for port in cmd.ports)
+        elif isinstance(cmd, Connect):
+            body.extend(
+                (CONNECT, self.string(cmd.dest), self.string(cmd.src), self.string(cmd.guard))
+            )
+        elif isinstance(cmd, Fsm):
+            body.extend((FSM, cmd.states))
+        else:
+            raise RuntimeError(f"Cannot serialize command {cmd!r}")
+
+    def component(self, component: Component):
+        self.signature(component.signature)
+        self.body.append(len(component.commands))
+        for cmd in component.commands:
+            self.command(cmd)
+
+    def finish(self, count: int) -> bytes:
+        blob = bytearray()
+        offsets = array("i", [0])
+        for text in self.strings:
+            blob += text.encode("utf-8")
+            offsets.append(len(blob))
+        parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, 0, count)]
+        parts.append(_LENGTH.pack(len(self.strings)))
+        parts.append(offsets.tobytes())
+        parts.append(_LENGTH.pack(len(blob)))
+        parts.append(bytes(blob))
+        for ints in (self.exprs, self.body):
+            parts.append(_LENGTH.pack(len(ints)))
+            parts.append(ints.tobytes())
+        return b"".join(parts)
+
+
+class _Reader:
+    def __init__(self, data):
+        view = memoryview(data)
+        magic, version, _, self.count = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise RuntimeError("Not a pyfilament IR file")
+        if version != FORMAT_VERSION:
+            raise RuntimeError(
+                f"IR format version {version} is not supported (expected {FORMAT_VERSION})"
+            )
+        pos = _HEADER.size
+
+        (nstrings,) = _LENGTH.unpack_from(view, pos)
+        pos += _LENGTH.size
+        offsets = self.ints(view, pos, nstrings + 1)
+        pos += 4 * (nstrings + 1)
+        (nblob,) = _LENGTH.unpack_from(view, pos)
+        pos += _LENGTH.size
+        blob = bytes(view[pos : pos + nblob])
+        pos += nblob
+        intern = sys.intern
+        self.strings = [
+            intern(blob[offsets[i] : offsets[i + 1]].decode("utf-8")) for i in range(nstrings)
+        ]
+
+        sections = []
+        for _ in range(2):
+            (length,) = _LENGTH.unpack_from(view, pos)
+            pos += _LENGTH.size
+            sections.append(self.ints(view, pos, length))
+            pos += 4 * length
+        view.release()
+        exprs, self.body = sections
+
+        self.exprs: List[SExpr] = []
+        i = 0
+        while i < len(exprs):
+            length = exprs[i]
+            self.exprs.append(SExpr([self.expr(ref) for ref in exprs[i + 1 : i + 1 + length]]))
+            i += 1 + length
+        self.pos = 0
+
+    @staticmethod
+    def ints(view: memoryview, pos: int, count: int) -> array:
+        ints = array("i")
+        ints.frombytes(view[pos : pos + 4 * count])
+        if sys.byteorder != "little":
+            ints.byteswap()
+        return ints
+
+    def expr(self, ref: int):
+        if ref == NONE:
+            return None
+        if ref & 1:
+            return self.strings[ref >> 1]
+        return self.exprs[ref >> 1]
+
+    def next(self) -> int:
+        value = self.body[self.pos]
+        self.pos += 1
+        return value
+
+    def string(self) -> Optional[str]:
+        index = self.next()
+        return None if index == NONE else self.strings[index]
+
+    def range_(self) -> Range:
+        lo = self.expr(self.next())
+        hi = self.expr(self.next())
+        return Range(lo, hi)
+
+    def port(self, direction: Direction) -> Port:
+        name = self.string()
+        width = self.next()
+        range_ = self.range_()
+        if direction == Direction.INTERFACE:
+            return InterfacePort(name, range_, width)
+        return Port(name, direction, range_, width)
+
+    def signature(self) -> Signature:
+        name = self.string()
+        events = self.expr(self.next()).as_list
+        interface = self.port(Direction.INTERFACE) if self.next() else None
+        in_ports = [self.port(Direction.IN) for _ in range(self.next())]
+        out_ports = [self.port(Direction.OUT) for _ in range(self.next())]
+        return Signature(name, events, interface, in_ports, out_ports)
+
+    def component(self) -> Component:
+        signature = self.signature()
+        commands = []
+        fsm_states = []
+        for _ in range(self.next()):
+            tag = self.next()
+            if tag == INSTANCE:
+                commands.append(Instance(self.string(), self.string(), self.string()))
+            elif tag == INVOKE:
+                variable, function = self.string(), self.string()
+                range_ = self.range_()
+                lower = self.next()
+                ports = tuple(self.string() for _ in range(self.next()))
+                cmd = Invoke(variable, function, range_, ports)
+                if lower:
+                    cmd.flag_lower()
+                commands.append(cmd)
+            elif tag == CONNECT:
+                commands.append(Connect(self.string(), self.string(), self.string()))
+            elif tag == FSM:
+                # Filled in once the component it belongs to exists
+                fsm_states.append((len(commands), self.next()))
+                commands.append(None)
+            else:
+                raise RuntimeError(f"Corrupt IR: unknown command tag {tag}")
+        if fsm_states:
+            # An Fsm only needs a component for its signature's interface
+            owner = Component(signature, [])
+            for index, states in fsm_states:
+                commands[index] = Fsm(owner, states)
+        return Component(signature, commands)
+
+    def components(self) -> List[Component]:
+        return [self.component() for _ in range(self.count)]
+
+
+def dumps(components: List[Component]) -> bytes:
+    writer = _Writer()
+    for component in components:
+        writer.component(component)
+    return writer.finish(len(components))
+
+
+def loads(data) -> List[Component]:
+    return _Reader(data).components()
+
+
+def dump(components: List[Component], path: str):
+    """
+    Write components to `path` atomically, so concurrent readers never see
+    a partial file.
+    """
+    data = dumps(components)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def load(path: str, use_mmap: bool = False) -> List[Component]:
+    """
+    Read the components stored at `path`, optionally through a read-only
+    memory map instead of reading the whole file first.
+    """
+    with open(path, "rb") as fp:
+        if not use_mmap:
+            return loads(fp.read())
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return loads(mapped)
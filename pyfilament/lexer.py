@@ -0,0 +1,130 @@
+import re
+from enum import Enum
+from typing import Iterable, Iterator, List
+
+
+class TokenKind(Enum):
+    LPAREN = 0
+    RPAREN = 1
+    ATOM = 2
+
+
+# Atoms are runs of alphanumerics, arithmetic/comparison operators and the
+# characters used in widths and dotted port names. Anything else (whitespace,
+# commas, colons, ...) is never matched and only separates atoms. Comments run
+# from ';' to the end of the line.
+_TOKEN_RE = re.compile(
+    r"(?P<atom>[\w+\-*/><=\[\]'.]+)"
+    r"|(?P<lparen>\()"
+    r"|(?P<rparen>\))"
+    r"|(?P<newline>\n)"
+    r"|(?P<comment>;[^\n]*)"
+)
+_ATOM_CHAR = re.compile(r"[\w+\-*/><=\[\]'.]")
+
+
+class Token:
+    __slots__ = ("kind", "text", "offset", "line", "column")
+
+    def __init__(self, kind: TokenKind, text: str, offset: int, line: int, column: int):
+        """
+        A single lexical token.
+
+        Args:
+            kind (TokenKind): The kind of token.
+            text (str): The source text of the token.
+            offset (int): Offset of the token from the start of the source.
+            line (int): 1-based line number of the token.
+            column (int): 1-based column number of the token.
+        """
+        self.kind = kind
+        self.text = text
+        self.offset = offset
+        self.line = line
+        self.column = column
+
+    def __repr__(self):
+        return f"{self.kind.name}({self.text!r}) at {self.line}:{self.column}"
+
+
+def tokenize(source: str, offset: int = 0, line: int = 1, column: int = 1) -> Iterator[Token]:
+    """
+    Split a source string into a stream of tokens in a single pass.
+
+    Args:
+        source (str): The text to tokenize.
+        offset (int): Offset of the start of `source` within the whole input.
+        line (int): Line number of the start of `source`.
+        column (int): Column number of the start of `source`.
+    """
+    line_start = 1 - column
+    for match in _TOKEN_RE.finditer(source):
+        group = match.lastgroup
+        start = match.start()
+        if group == "atom":
+            yield Token(TokenKind.ATOM, match.group(), offset + start, line, start - line_start + 1)
+        elif group == "newline":
+            line += 1
+            line_start = start + 1
+        elif group == "comment":
+            continue
+        elif group == "lparen":
+            yield Token(TokenKind.LPAREN, "(", offset + start, line, start - line_start + 1)
+        else:
+            yield Token(TokenKind.RPAREN, ")", offset + start, line, start - line_start + 1)
+
+
+def tokenize_chunks(chunks: Iterable[str]) -> Iterator[Token]:
+    """
+    Tokenize text arriving in arbitrary chunks, e.g. from a file read piecewise.
+
+    Each chunk is tokenized up to its last complete token: only a trailing
+    partial atom is held back until the rest of it arrives, and a trailing
+    comment is skipped up to the end of its line, so memory stays bounded by
+    the longest atom however long the lines are.
+    """
+    # Pieces of an atom that may continue in the next chunk
+    held: List[str] = []
+    offset = 0
+    line = 1
+    column = 1
+    in_comment = False
+    for chunk in chunks:
+        if in_comment:
+            end = chunk.find("\n")
+            if end < 0:
+                offset += len(chunk)
+                continue
+            in_comment = False
+            offset += end
+            chunk = chunk[end:]
+
+        # Atoms never contain ';', so one after the last newline starts a
+        # comment that runs past the end of the chunk
+        comment = chunk.find(";", chunk.rfind("\n") + 1)
+        if comment >= 0:
+            in_comment = True
+            skipped = len(chunk) - comment
+            cut = comment
+        else:
+            skipped = 0
+            cut = len(chunk)
+            while cut > 0 and _ATOM_CHAR.match(chunk[cut - 1]):
+                cut -= 1
+            if cut == 0:
+                held.append(chunk)
+                continue
+
+        held.append(chunk[:cut])
+        complete = "".join(held)
+        held = [chunk[cut:]] if not in_comment and cut < len(chunk) else []
+        yield from tokenize(complete, offset, line, column)
+        offset += len(complete) + skipped
+        newlines = complete.count("\n")
+        if newlines:
+            line += newlines
+            column = len(complete) - complete.rfind("\n")
+        else:
+            column += len(complete)
+    if held:
+        yield from tokenize("".join(held), offset, line, column)
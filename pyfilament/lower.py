@@ -1,130 +1,148 @@
-from pyfilament.command import Invoke, Instance, Connect
+from typing import List, Mapping, Optional
+
+from pyfilament import metrics
+from pyfilament.check import PRIMITIVES, Primitive
+from pyfilament.command import Command, Invoke, Instance, Connect
 from pyfilament.component import Component
-from pyfilament.port import Port, Direction
+from pyfilament.port import Port
 from pyfilament.fsm import Fsm
 from pyfilament.event import Event
 
 
-def generate_lower(component: Component):
+def generate_lower(component: Component, primitives: Optional[Mapping[str, Primitive]] = None):
     """
     Entry point to transform a component into lower filament.
 
     Args:
         component (Component): Component to be transformed.
+        primitives (Optional[Mapping[str, Primitive]]): The timing and ports
+            of every component it may instantiate; PRIMITIVES by default.
     """
-    lower_fil = FSMgen.generate(component)
+    lower_fil = FSMgen.generate(component, primitives)
     return lower_fil
 
 
+# Instances of unknown components are lowered as two-input operators
+BINARY = PRIMITIVES["Add"]
+
+
 class FSMgen:
-    def __init__(self, ctx: Component):
+    def __init__(self, ctx: Component, primitives: Optional[Mapping[str, Primitive]] = None):
         """
         Initialize the FSM generator with FSM details and context.
         """
         self.ctx = ctx
+        self.primitives = primitives if primitives is not None else PRIMITIVES
         self.ports = ctx.signature.in_ports + ctx.signature.out_ports
         self.states = self.determine_states(self.ports)
         self.fsm = self.new()
+        for cmd in ctx.commands:
+            if isinstance(cmd, Instance):
+                self.process_command(cmd)
 
     def new(self) -> Fsm:
         return Fsm(comp=self.ctx, states=self.states)
 
-    def eval_event(self, event: Event):
-        try:
-            G = 0
-            return eval(repr(event))
-        except NameError:
+    def eval_event(self, event: Event) -> int:
+        """
+        FSM state index of an event: its offset from its own event variable.
+        """
+        if event.linear is None or len(event.linear.terms) > 1:
             raise ValueError(f"Invalid expression: {event}")
+        return event.linear.offset
 
     def determine_states(self, ports: list[Port]) -> int:
-        unique_events = set()
-
-        for port in ports:
-            if port.direction == Direction.IN:
-                unique_events.add(port.range_.lo)
-                unique_events.add(port.range_.hi)
-            else:
-                unique_events.add(port.range_.lo)
-
-        # Evaluate unique symbolic expressions like G and G+1
-        # Convert them into concrete indices if needed.
-        concrete_events = {repr(event) for event in unique_events}
-        return len(concrete_events)
-
-    def connect_register(self, reg_name, cmd: Invoke):
-        if reg_name == cmd.function:
-            # Find the index of the Invoke command to insert after it
-            index = self.ctx.commands.index(cmd)
-            # Append the Connect commands immediately after the Invoke command
+        """
+        States the FSM needs to reach the start of every port's window, up
+        to the output that becomes available last. Lowering raises it to
+        cover any later state an invoke reads.
+        """
+        starts = (port.range_.lo.linear for port in ports)
+        return 1 + max((lo.offset for lo in starts if lo is not None), default=0)
 
-            self.ctx.commands[index + 1 : index + 1] = [
-                Connect(
-                    dest=f"{cmd.variable}.write_en",
-                    src=self.fsm.port(cmd.range_.lo.eval_event()),
-                ),
-                Connect(
-                    dest=f"{cmd.variable}.in",
-                    src=self.fsm.port(cmd.range_.lo.eval_event()),
-                    guard=cmd.ports[0],
-                ),
-            ]
-            cmd.flag_lower()
+    def state(self, index: int) -> str:
+        """
+        The FSM port that is active `index` cycles after the trigger,
+        growing the FSM to include it.
+        """
+        self.fsm.states = max(self.fsm.states, index + 1)
+        return self.fsm.port(index)
+
+    def connect_register(self, cmd: Invoke) -> List[Connect]:
+        return [
+            Connect(
+                dest=f"{cmd.variable}.write_en",
+                src=self.state(self.eval_event(cmd.range_.lo)),
+            ),
+            Connect(
+                dest=f"{cmd.variable}.in",
+                src=self.state(self.eval_event(cmd.range_.lo)),
+                guard=cmd.ports[0],
+            ),
+        ]
 
     def process_command(self, cmd):
-        if cmd.type_name == "Mux":
-            raise NotImplementedError("Mux type is not implemented.")
         return cmd.type_name != "Register"
 
-    def connect_comp(self, obj_name, cmd: Invoke):
-        if obj_name == cmd.function:
-            # Find the index of the Invoke command to insert after it
-            index = self.ctx.commands.index(cmd)
-            # Append the Connect commands immediately after the Invoke command
-
-            self.ctx.commands[index + 1 : index + 1] = [
-                Connect(
-                    dest=f"{cmd.variable}.left",
-                    src=self.fsm.port(cmd.range_.lo.eval_event()),
-                    guard=cmd.ports[0],
-                ),
+    def connect_comp(self, cmd: Invoke, instance: Instance) -> List[Connect]:
+        """
+        Drive each input of the invoked component with its argument, in the
+        state where the component first needs it.
+        """
+        primitive = self.primitives.get(instance.type_name, BINARY)
+        start = self.eval_event(cmd.range_.lo)
+        connects = []
+        if primitive.interface is not None:
+            connects.append(
+                Connect(dest=f"{cmd.variable}.{primitive.interface}", src=self.state(start))
+            )
+        for port, arg in zip(primitive.inputs, cmd.ports):
+            connects.append(
                 Connect(
-                    dest=f"{cmd.variable}.right",
-                    src=self.fsm.port(cmd.range_.lo.eval_event()),
-                    guard=cmd.ports[1],
-                ),
-            ]
-            cmd.flag_lower()
-
-    def connect_fsm_ports(self):
-        # Fetch invoke commands
-        invokes = [cmd for cmd in self.ctx.commands if isinstance(cmd, Invoke)]
-        registers = [
-            cmd.variable
-            for cmd in self.ctx.commands
-            if isinstance(cmd, Instance) and cmd.type_name == "Register"
-        ]
-        objects = [
-            cmd.variable
-            for cmd in self.ctx.commands
-            if isinstance(cmd, Instance) and self.process_command(cmd)
-        ]
+                    dest=f"{cmd.variable}.{port}",
+                    src=self.state(start + primitive.port_needs[port][0]),
+                    guard=arg,
+                )
+            )
+        return connects
+
+    def lower_invoke(self, cmd: Invoke) -> List[Command]:
+        """
+        Lower an invoke of a known instance into a port-less invoke followed
+        by the FSM-guarded connections that drive its inputs.
+        """
+        instance = self.ctx.graph.instance(cmd)
+        if instance is None:
+            return [cmd]
 
-        for reg_name in registers:
-            for cmd in invokes:
-                self.connect_register(reg_name, cmd)
+        lowered = Invoke(cmd.variable, cmd.function, cmd.range_, cmd.ports)
+        lowered.flag_lower()
+        if self.process_command(instance):
+            return [lowered, *self.connect_comp(lowered, instance)]
+        return [lowered, *self.connect_register(lowered)]
 
-        for obj_name in objects:
-            if obj_name.type_name == "Mux":
-                raise NotImplementedError(f"Only two input components and registers are supported, not {obj_name} object!")
-            for cmd in invokes:
-                self.connect_comp(obj_name, cmd)
+    def connect_fsm_ports(self) -> List[Command]:
+        """
+        Build the lowered command list in a single pass over the component.
+        """
+        commands = []
+        for cmd in self.ctx.commands:
+            if isinstance(cmd, Invoke):
+                commands.extend(self.lower_invoke(cmd))
+            else:
+                commands.append(cmd)
+        return commands
 
     def fsm_command(self):
         return self.fsm
 
-    def generate(ctx: Component):
-        generator = FSMgen(ctx)
-        generator.connect_fsm_ports()
-        generator.ctx.commands.append(generator.fsm_command())
-
-        return ctx
+    @staticmethod
+    def generate(ctx: Component, primitives: Optional[Mapping[str, Primitive]] = None) -> Component:
+        """
+        Lower a component, returning a new Component and leaving `ctx` untouched.
+        """
+        generator = FSMgen(ctx, primitives)
+        commands = generator.connect_fsm_ports()
+        commands.append(generator.fsm_command())
+        metrics.count("commands_emitted", len(commands))
+        return Component(ctx.signature, commands)
@@ -0,0 +1,133 @@
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from pyfilament.lexer import Token, TokenKind
+
+# Signature of a hook: (kind, name, value), where kind is "stage" (value is
+# the elapsed seconds) or "counter" (value is the increment).
+Hook = Callable[[str, str, float], None]
+
+# The collector currently receiving measurements. Instrumentation points
+# check this first, so nothing is measured while it is None.
+active: Optional["Metrics"] = None
+
+_disabled = nullcontext()
+
+
+class Metrics:
+    def __init__(self, hooks: Optional[List[Hook]] = None):
+        """
+        Collects stage timings, counters and solver statistics for a run of
+        the compiler pipeline.
+
+        Args:
+            hooks (Optional[List[Hook]]): Callbacks invoked on every stage
+                completion and counter update, as they happen.
+        """
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.z3_statistics: Dict[str, float] = {}
+        self.hooks = list(hooks or [])
+
+    def add_hook(self, hook: Hook):
+        self.hooks.append(hook)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            for hook in self.hooks:
+                hook("stage", name, elapsed)
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+        for hook in self.hooks:
+            hook("counter", name, amount)
+
+    def record_z3_statistics(self, statistics):
+        """
+        Accumulate the entries of a z3 Statistics object.
+        """
+        for key, value in statistics:
+            self.z3_statistics[key] = self.z3_statistics.get(key, 0) + value
+
+    def merge(self, other: dict):
+        """
+        Fold in the dictionary form of metrics collected elsewhere, e.g. in a
+        worker process.
+        """
+        for name, seconds in other.get("stages", {}).items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        for name, amount in other.get("counters", {}).items():
+            self.counters[name] = self.counters.get(name, 0) + amount
+        for key, value in other.get("z3_statistics", {}).items():
+            self.z3_statistics[key] = self.z3_statistics.get(key, 0) + value
+
+    def as_dict(self) -> dict:
+        return {
+            "stages": dict(self.stages),
+            "counters": dict(self.counters),
+            "z3_statistics": dict(self.z3_statistics),
+        }
+
+    def summary(self) -> str:
+        lines = [f"{name:<24} {seconds * 1000:10.3f} ms" for name, seconds in self.stages.items()]
+        lines += [f"{name:<24} {amount:10d}" for name, amount in self.counters.items()]
+        return "\n".join(lines)
+
+
+@contextmanager
+def collect(metrics: Optional[Metrics] = None, profiler=None):
+    """
+    Route measurements from the pipeline into `metrics` (a new Metrics by
+    default) for the duration of the block, optionally under a profiler such
+    as a cProfile.Profile.
+    """
+    global active
+    metrics = metrics if metrics is not None else Metrics()
+    previous, active = active, metrics
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        active = previous
+
+
+def stage(name: str):
+    """
+    Time a block as a pipeline stage, if metrics are being collected.
+    """
+    if active is None:
+        return _disabled
+    return active.stage(name)
+
+
+def count(name: str, amount: int = 1):
+    if active is not None:
+        active.count(name, amount)
+
+
+def count_tokens(tokens: Iterable[Token], metrics: Metrics) -> Iterator[Token]:
+    """
+    Pass tokens through while counting them, and the S-expression nodes
+    they close, into `metrics`.
+    """
+    ntokens = 0
+    nodes = 0
+    try:
+        for token in tokens:
+            ntokens += 1
+            if token.kind is TokenKind.RPAREN:
+                nodes += 1
+            yield token
+    finally:
+        metrics.count("tokens", ntokens)
+        metrics.count("sexpr_nodes", nodes)
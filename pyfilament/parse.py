@@ -1,83 +1,54 @@
-from typing import List, Tuple
+import sys
+from typing import Iterable, Iterator, List, Tuple
 
+from pyfilament import metrics
+from pyfilament.lexer import Token, TokenKind, tokenize, tokenize_chunks
 from pyfilament.sexpr import SExpr
 
 
-def parens_balanced(source: str) -> bool:
-    count = 0
-
-    for ch in source:
-        if ch == "(":
-            count += 1
-        elif ch == ")":
-            count -= 1
-        if count < 0:
-            return False
-
-    return count == 0
-
-
-def is_operator(c):
-    return c in ("+", "-", "*", "/", ">", "<", "=")
-
+def build_exprs(tokens: Iterable[Token]) -> Iterator[Tuple[SExpr, Token]]:
+    """
+    Build S-expressions from a token stream, yielding each top-level
+    expression together with its closing token as soon as it is complete.
+    """
+    if metrics.active is not None:
+        tokens = metrics.count_tokens(tokens, metrics.active)
+
+    stack = []
+    current = None
+
+    for token in tokens:
+        if token.kind is TokenKind.ATOM:
+            # Atoms outside of any list are ignored, as are other stray characters.
+            # Keywords and names repeat constantly, so share one copy of each.
+            if current is not None:
+                current.append(sys.intern(token.text))
+        elif token.kind is TokenKind.LPAREN:
+            stack.append(current)
+            current = []
+        else:
+            if current is None:
+                raise RuntimeError(
+                    f"Parentheses unbalanced in S-Expr: unexpected ')' at {token.line}:{token.column}"
+                )
+            expr = SExpr(current)
+            current = stack.pop()
+            if current is None:
+                yield expr, token
+            elif len(expr) > 0:
+                current.append(expr)
 
-def append_if_nonempty(s: str | SExpr, l: List[str | SExpr]):
-    if len(s) > 0:
-        l.append(s)
+    if current is not None:
+        raise RuntimeError(f"Parentheses unbalanced in S-Expr: {len(stack)} unclosed '('")
 
 
 def parse_expr(source: str) -> Tuple[SExpr, int]:
     """
-    Parse a string into an S-expression representation.
-    """
-    source = source.strip()
-    assert (
-        len(source) > 0 and source[0] == "(" and source[-1] == ")"
-    ), """
-        S-Expression must be non-empty and must begin and end with parentheses.
+    Parse the first S-expression in a string, returning it along with the
+    offset of its closing parenthesis.
     """
-
-    if not parens_balanced(source):
-        raise RuntimeError(f"Parentheses unbalanced in S-Expr: {source}")
-
-    pos = 1
-    expr = []
-    current_term = ""
-
-    while pos < len(source):
-        if (
-            source[pos].isalnum()
-            or is_operator(source[pos])
-            or source[pos] in ("[", "]", "_", "'", ".")
-        ):
-            current_term += source[pos]
-        else:
-            if source[pos] == ";":  # comment
-                append_if_nonempty(current_term, expr)
-                while source[pos] != "\n":
-                    pos += 1
-            if len(current_term) > 0:
-                append_if_nonempty(current_term, expr)
-                current_term = ""
-            if source[pos] == "(":
-                depth = 0
-                i = 1
-                while source[pos + i] != ")" or depth > 0:
-                    if source[pos + i] == "(":
-                        depth += 1
-                    elif source[pos + i] == ")":
-                        depth -= 1
-                    i += 1
-                inner_expr, _ = parse_expr(source[pos : pos + i + 1])
-                append_if_nonempty(inner_expr, expr)
-                pos += i
-            elif source[pos] == ")":
-                return SExpr(expr), pos
-            elif source[pos].isalnum():
-                current_term += source[pos]
-
-        pos += 1
-
+    for expr, closing in build_exprs(tokenize(source)):
+        return expr, closing.offset
     raise RuntimeError("Failed to parse S-Expression")
 
 
@@ -85,18 +56,7 @@ def parse(source: str) -> List[SExpr]:
     """
     Parse a string containing multiple S expressions
     """
-    exprs = []
-    pos = 0
-    while pos < len(source):
-        while pos < len(source) and source[pos] != "(":
-            pos += 1
-        if pos >= len(source):
-            break
-        else:
-            expr, offset = parse_expr(source[pos:])
-            exprs.append(expr)
-            pos += offset
-    return exprs
+    return [expr for expr, _ in build_exprs(tokenize(source))]
 
 
 def parse_file(filepath: str):
@@ -105,3 +65,18 @@ def parse_file(filepath: str):
     """
     with open(filepath, "r", encoding="utf-8") as fp:
         return parse(fp.read())
+
+
+def iter_file(filepath: str, chunk_size: int = 1 << 16) -> Iterator[SExpr]:
+    """
+    Lazily parse a file containing S Expressions, reading it in chunks and
+    yielding each top-level expression as soon as it is closed.
+
+    Args:
+        filepath (str): Path of the file to parse.
+        chunk_size (int): Number of characters to read at a time.
+    """
+    with open(filepath, "r", encoding="utf-8") as fp:
+        chunks = iter(lambda: fp.read(chunk_size), "")
+        for expr, _ in build_exprs(tokenize_chunks(chunks)):
+            yield expr
@@ -11,6 +11,8 @@ class Direction(Enum):
 
 
 class Port:
+    __slots__ = ("name", "direction", "range_", "width")
+
     def __init__(self, name: str, direction: Direction, range_: Range, width: int):
         self.name = name
         self.direction = direction
@@ -50,6 +52,8 @@ class Port:
 
 
 class InterfacePort(Port):
+    __slots__ = ("event",)
+
     def __init__(self, name: str, event: Range, width: int):
         """
         Represent an interface port with an event.
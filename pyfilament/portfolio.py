@@ -0,0 +1,215 @@
+"""
+Portfolio solving: race one component's timing constraints under several z3
+configurations in parallel processes and keep the first definitive answer.
+
+Each worker elaborates the component from its S-expression and builds the
+constraints itself, so nothing z3-specific crosses a process boundary.
+"""
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import List, Optional, Sequence, Tuple
+
+from pyfilament import metrics
+from pyfilament.component import Component
+from pyfilament.sexpr import SExpr
+
+
+class SolverConfig:
+    def __init__(
+        self,
+        name: str,
+        tactics: Optional[Sequence[str]] = None,
+        seed: Optional[int] = None,
+        logic: Optional[str] = None,
+        optimize: bool = False,
+    ):
+        """
+        One way of configuring z3 for the timing constraints.
+
+        Args:
+            name (str): Reported as the winner when this configuration answers first.
+            tactics (Optional[Sequence[str]]): Tactic names chained with Then
+                to build the solver.
+            seed (Optional[int]): Random seed for the solver.
+            logic (Optional[str]): Build the solver with SolverFor this logic.
+            optimize (bool): Use an Optimize solver that minimizes the sum of
+                the start times, giving the tightest schedule.
+        """
+        self.name = name
+        self.tactics = tuple(tactics) if tactics else None
+        self.seed = seed
+        self.logic = logic
+        self.optimize = optimize
+
+    def make_solver(self):
+        from z3 import Optimize, Solver, SolverFor, Tactic, Then
+
+        if self.optimize:
+            solver = Optimize()
+        elif self.tactics:
+            tactic = Then(*self.tactics) if len(self.tactics) > 1 else Tactic(self.tactics[0])
+            solver = tactic.solver()
+        elif self.logic:
+            solver = SolverFor(self.logic)
+        else:
+            solver = Solver()
+        if self.seed is not None:
+            solver.set("random_seed", self.seed)
+        return solver
+
+    def __repr__(self):
+        return f"SolverConfig({self.name})"
+
+
+# Reported as the winner when no race was needed
+NATIVE = "difference"
+
+DEFAULT_PORTFOLIO = [
+    SolverConfig("default"),
+    SolverConfig("qf-lia", logic="QF_LIA"),
+    SolverConfig("simplify-smt", tactics=("simplify", "solve-eqs", "smt")),
+    SolverConfig("seed-1", seed=1),
+    SolverConfig("optimize", optimize=True),
+]
+
+
+def solve_config(component: Component, config: SolverConfig, timeout: Optional[int] = None):
+    """
+    Solve the constraints of a component under one configuration.
+
+    Returns the schedule, or None if the constraints are unsatisfiable.
+    Raises SolverTimeout if z3 could not decide them.
+    """
+    from z3 import Sum
+    from pyfilament.z3_solver import (
+        check,
+        command_constraints,
+        component_start_times,
+        component_states,
+        fsm_constraints,
+        limit_solver,
+        model_results,
+        sat,
+    )
+
+    solver = config.make_solver()
+    limit_solver(solver, timeout)
+    start_times = component_start_times(component)
+    states = component_states(component)
+    solver.add(fsm_constraints(states))
+    for cmd in component.commands:
+        solver.add(command_constraints(cmd, start_times, component.graph))
+    if config.optimize:
+        solver.minimize(Sum([term for term in start_times.values()]))
+
+    if check(solver) == sat:
+        return model_results(solver.model(), start_times, states, component.symbols)
+    return None
+
+
+def portfolio_worker(conn, source: str, config: SolverConfig, timeout: Optional[int]):
+    """
+    Solve in a worker process, sending ("sat", schedule), ("unsat", None),
+    ("unknown", message) or ("error", message) back over `conn`.
+    """
+    from pyfilament.compiler import describe_error
+    from pyfilament.parse import parse
+    from pyfilament.z3_solver import SolverTimeout
+
+    try:
+        component = Component.from_sexpr(parse(source)[0])
+        schedule = solve_config(component, config, timeout)
+        conn.send(("unsat", None) if schedule is None else ("sat", schedule))
+    except SolverTimeout as err:
+        conn.send(("unknown", describe_error(err)))
+    except Exception as err:
+        conn.send(("error", describe_error(err)))
+    finally:
+        conn.close()
+
+
+def solve_portfolio(
+    expr: SExpr,
+    configs: Optional[List[SolverConfig]] = None,
+    timeout: Optional[int] = None,
+    mp_context=None,
+) -> Tuple[Optional[dict], str]:
+    """
+    Race the configurations against each other on one component.
+
+    Returns the first definitive answer (a schedule, or None for
+    unsatisfiable) and the name of the configuration that gave it; the other
+    workers are killed. Raises SolverTimeout if no configuration could decide
+    the constraints, and RuntimeError if they all failed.
+
+    Args:
+        expr (SExpr): The component definition.
+        configs (Optional[List[SolverConfig]]): Defaults to DEFAULT_PORTFOLIO.
+        timeout (Optional[int]): Milliseconds each configuration may spend
+            per query.
+        mp_context: The multiprocessing context to start workers with.
+    """
+    from pyfilament.z3_solver import SolverTimeout
+
+    configs = configs or DEFAULT_PORTFOLIO
+    mp_context = mp_context or multiprocessing.get_context()
+    source = str(expr)
+
+    workers = {}
+    for config in configs:
+        receiver, sender = mp_context.Pipe(duplex=False)
+        worker = mp_context.Process(
+            target=portfolio_worker, args=(sender, source, config, timeout), daemon=True
+        )
+        worker.start()
+        sender.close()
+        workers[receiver] = (config, worker)
+
+    failures = []
+    try:
+        with metrics.stage("solve.portfolio"):
+            while workers:
+                for receiver in wait(list(workers)):
+                    config, worker = workers.pop(receiver)
+                    try:
+                        status, value = receiver.recv()
+                    except EOFError:
+                        status, value = "error", f"Worker exited with code {worker.exitcode}"
+                    receiver.close()
+                    worker.join()
+                    if status in ("sat", "unsat"):
+                        metrics.count(f"portfolio_win.{config.name}")
+                        return value, config.name
+                    failures.append((status, f"{config.name}: {value}"))
+    finally:
+        for receiver, (_, worker) in workers.items():
+            worker.kill()
+            receiver.close()
+        for _, worker in workers.values():
+            worker.join()
+
+    reasons = "; ".join(reason for _, reason in failures)
+    if any(status == "unknown" for status, _ in failures):
+        raise SolverTimeout(f"No configuration decided the constraints: {reasons}")
+    raise RuntimeError(f"Every solver configuration failed: {reasons}")
+
+
+def solve_component_portfolio(
+    expr: SExpr,
+    component: Component,
+    configs: Optional[List[SolverConfig]] = None,
+    timeout: Optional[int] = None,
+) -> Tuple[Optional[dict], str]:
+    """
+    Like solve_component_constraints, but components outside difference
+    logic are solved by a portfolio race rather than a single z3 solver.
+
+    Returns the schedule and the name of the configuration that won the
+    race, or NATIVE if the native difference solver was enough.
+    """
+    from pyfilament.difference import NotDifferenceLogic, solve_difference_constraints
+
+    try:
+        return solve_difference_constraints(component), NATIVE
+    except NotDifferenceLogic:
+        return solve_portfolio(expr, configs, timeout)
@@ -0,0 +1,156 @@
+"""
+Registry of the user-defined components of a design.
+
+A component may instantiate another component defined in the same file just
+as it would a primitive. Each callee is summarized once, by the timing of its
+ports, and its callers are checked and lowered against that summary instead
+of its body. The call graph is compiled bottom-up in levels: every component
+in a level only instantiates components of earlier levels, so a level can be
+compiled in parallel, and a design costs one compilation per distinct
+component however many times each is instantiated.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from pyfilament.check import PRIMITIVES, Primitive
+from pyfilament.command import Instance
+from pyfilament.sexpr import SExpr
+from pyfilament.signature import Signature
+
+
+class Summary:
+    def __init__(self, name: str, primitive: Primitive):
+        """
+        What callers need to know about a compiled component.
+
+        Args:
+            name (str): The component name.
+            primitive (Primitive): The timing of its ports, relative to its
+                first event.
+        """
+        self.name = name
+        self.primitive = primitive
+
+    @staticmethod
+    def from_sexpr(expr: SExpr) -> "Summary":
+        signature = Signature.from_sexpr(expr)
+        return Summary(signature.name, Primitive.from_signature(signature))
+
+    @property
+    def latency(self) -> int:
+        """
+        Cycles from an invocation to its last output becoming available.
+        """
+        return max((lo for lo, _ in self.primitive.outputs.values()), default=0)
+
+    def __repr__(self):
+        return f"{self.name}: {self.primitive}"
+
+
+class Registry:
+    def __init__(self, exprs: Iterable[SExpr] = ()):
+        """
+        The components of one design, by name.
+
+        Args:
+            exprs (Iterable[SExpr]): Component definitions to register.
+        """
+        self.exprs: Dict[str, SExpr] = {}
+        # Component -> the registered components it instantiates, once the
+        # whole design is registered
+        self._callees: Dict[str, List[str]] = {}
+        self.summaries: Dict[str, Summary] = {}
+        for expr in exprs:
+            self.register(expr)
+
+    def register(self, expr: SExpr) -> str:
+        name = expr["comp"]
+        if name in self.exprs:
+            raise RuntimeError(f"Component {name} is defined more than once")
+        if name in PRIMITIVES:
+            raise RuntimeError(f"Component {name} has the name of a primitive")
+        self.exprs[name] = expr
+        self._callees.clear()
+        return name
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.exprs
+
+    def callees(self, name: str) -> List[str]:
+        """
+        The registered components `name` instantiates, without duplicates.
+        """
+        callees = self._callees.get(name)
+        if callees is None:
+            types = (Instance.from_sexpr(cmd).type_name for cmd in self.exprs[name]["instantiate"])
+            callees = self._callees[name] = list(
+                dict.fromkeys(type_name for type_name in types if type_name in self.exprs)
+            )
+        return callees
+
+    def levels(self) -> List[List[str]]:
+        """
+        The components grouped so each only instantiates components of
+        earlier groups, leaves first. Raises RuntimeError, naming them, if
+        some components instantiate each other.
+        """
+        depth: Dict[str, int] = {}
+        remaining = {name: len(self.callees(name)) for name in self.exprs}
+        callers: Dict[str, List[str]] = {name: [] for name in self.exprs}
+        for name in self.exprs:
+            for callee in self.callees(name):
+                callers[callee].append(name)
+
+        ready = [name for name, count in remaining.items() if count == 0]
+        while ready:
+            name = ready.pop()
+            depth[name] = max((depth[callee] + 1 for callee in self.callees(name)), default=0)
+            for caller in callers[name]:
+                remaining[caller] -= 1
+                if remaining[caller] == 0:
+                    ready.append(caller)
+
+        if len(depth) < len(self.exprs):
+            cycle = ", ".join(name for name in self.exprs if name not in depth)
+            raise RuntimeError(f"Components instantiate each other: {cycle}")
+        levels: List[List[str]] = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+        for name in self.exprs:
+            levels[depth[name]].append(name)
+        return levels
+
+    def summary(self, name: str) -> Summary:
+        """
+        The summary of a registered component, computed once.
+        """
+        summary = self.summaries.get(name)
+        if summary is None:
+            summary = self.summaries[name] = Summary.from_sexpr(self.exprs[name])
+        return summary
+
+    def callee_summaries(self, name: str) -> Optional[Dict[str, Summary]]:
+        """
+        The summaries a caller is compiled against, or None if it
+        instantiates no registered component.
+        """
+        callees = self.callees(name)
+        if not callees:
+            return None
+        return {callee: self.summary(callee) for callee in callees}
+
+
+def callee_context(callees: Optional[Dict[str, Summary]]) -> str:
+    """
+    The callee timing a caller's compiled output depends on, as text for
+    cache keys.
+    """
+    return "\n".join(repr(callees[name]) for name in sorted(callees or ()))
+
+
+def primitives_with(callees: Optional[Dict[str, Summary]]) -> Dict[str, Primitive]:
+    """
+    The primitives plus the timing of the given callees.
+    """
+    if not callees:
+        return PRIMITIVES
+    primitives = dict(PRIMITIVES)
+    primitives.update((name, summary.primitive) for name, summary in callees.items())
+    return primitives
@@ -0,0 +1,302 @@
+"""
+A long-running compile server speaking JSON lines over stdin/stdout or a
+Unix socket, and a thin client for it.
+
+Each request is one JSON object per line:
+
+    {"id": 1, "op": "compile", "path": "design.fil"}
+    {"id": 2, "op": "compile", "source": "(comp main ...)"}
+    {"id": 3, "op": "stats"}
+    {"id": 4, "op": "shutdown"}
+
+and each gets one JSON line back carrying the same "id". Compile responses
+hold a "results" list with one entry per component in the input.
+"""
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+from collections import OrderedDict
+from typing import IO, Dict, List, Optional
+
+from pyfilament.cache import CompileCache
+from pyfilament.compiler import CompileResult, compile_expr, describe_error
+from pyfilament.parse import iter_file, parse
+from pyfilament.registry import Registry, Summary, callee_context
+from pyfilament.sexpr import SExpr
+
+
+class CompileServer:
+    def __init__(self, use_cache: bool = True, max_components: int = 4096):
+        """
+        Compiler state kept warm between requests.
+
+        Args:
+            use_cache (bool): Also consult the on-disk compilation cache.
+            max_components (int): How many compiled components to keep in
+                memory, least recently used first out.
+        """
+        # Load z3 up front so no request pays for it
+        import pyfilament.z3_solver  # noqa: F401
+
+        self.use_cache = use_cache
+        self.max_components = max_components
+        # Content hash -> (schedule, lowered text)
+        self.components: "OrderedDict[str, tuple]" = OrderedDict()
+        # Path -> ((mtime, size), parsed components) for files seen before
+        self.files = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.running = True
+
+    def compile_component(
+        self,
+        path: str,
+        index: int,
+        expr: SExpr,
+        callees: Optional[Dict[str, Summary]] = None,
+    ) -> CompileResult:
+        name = expr["comp"]
+        result = CompileResult(path, index, name if isinstance(name, str) else None)
+        # Callers must be recompiled when the timing of a callee changes
+        key = CompileCache.key(expr, callee_context(callees))
+        compiled = self.components.get(key)
+        if compiled is not None:
+            self.hits += 1
+            self.components.move_to_end(key)
+        else:
+            self.misses += 1
+            try:
+                compiled = compile_expr(expr, self.use_cache, callees=callees)
+            except Exception as err:
+                result.error = describe_error(err)
+                return result
+            self.components[key] = compiled
+            if len(self.components) > self.max_components:
+                self.components.popitem(last=False)
+        result.schedule, result.lowered = compiled
+        return result
+
+    def read_file(self, path: str) -> List[SExpr]:
+        """
+        Parse a file, reusing the previous parse while it is unchanged on disk.
+        """
+        info = os.stat(path)
+        stamp = (info.st_mtime_ns, info.st_size)
+        known = self.files.get(path)
+        if known is not None and known[0] == stamp:
+            return known[1]
+        exprs = list(iter_file(path))
+        self.files[path] = (stamp, exprs)
+        return exprs
+
+    def compile(self, request: dict) -> List[CompileResult]:
+        if "source" in request:
+            path = request.get("path", "<source>")
+            exprs = parse(request["source"])
+        else:
+            path = request["path"]
+            exprs = self.read_file(path)
+        return self.compile_design(path, exprs)
+
+    def compile_design(self, path: str, exprs: List[SExpr]) -> List[CompileResult]:
+        """
+        Compile the components of one file, callees before their callers,
+        as compile_files does.
+        """
+        results: List[Optional[CompileResult]] = [None] * len(exprs)
+        registry = Registry()
+        indices: Dict[str, int] = {}
+        for index, expr in enumerate(exprs):
+            try:
+                indices[registry.register(expr)] = index
+            except RuntimeError as err:
+                results[index] = CompileResult(path, index, expr["comp"], error=describe_error(err))
+        try:
+            levels = registry.levels()
+        except RuntimeError as err:
+            for name, index in indices.items():
+                results[index] = CompileResult(path, index, name, error=describe_error(err))
+            levels = []
+        for level in levels:
+            for name in level:
+                index = indices[name]
+                failed = [
+                    callee for callee in registry.callees(name) if not results[indices[callee]].ok
+                ]
+                if failed:
+                    err = RuntimeError(
+                        f"Instantiates {', '.join(failed)}, which failed to compile"
+                    )
+                    results[index] = CompileResult(path, index, name, error=describe_error(err))
+                else:
+                    results[index] = self.compile_component(
+                        path, index, exprs[index], registry.callee_summaries(name)
+                    )
+        return results
+
+    def handle(self, request: dict) -> dict:
+        """
+        Answer one decoded request.
+        """
+        response = {"id": request.get("id")}
+        op = request.get("op", "compile")
+        try:
+            with self.lock:
+                if op == "compile":
+                    response["results"] = [
+                        result_to_dict(result) for result in self.compile(request)
+                    ]
+                elif op == "stats":
+                    response["components"] = len(self.components)
+                    response["files"] = len(self.files)
+                    response["hits"] = self.hits
+                    response["misses"] = self.misses
+                elif op == "ping":
+                    pass
+                elif op == "shutdown":
+                    self.running = False
+                else:
+                    raise RuntimeError(f"Unknown request op: {op}")
+        except Exception as err:
+            response["error"] = describe_error(err)
+        return response
+
+    def handle_line(self, line: str) -> Optional[str]:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            request = json.loads(line)
+        except ValueError as err:
+            return json.dumps({"id": None, "error": describe_error(err)})
+        return json.dumps(self.handle(request))
+
+    def serve_stream(self, infile: IO[str], outfile: IO[str]):
+        """
+        Serve requests read line by line from `infile` until EOF or shutdown.
+        """
+        for line in infile:
+            reply = self.handle_line(line)
+            if reply is not None:
+                outfile.write(reply + "\n")
+                outfile.flush()
+            if not self.running:
+                break
+
+    def serve_unix(self, path: str):
+        """
+        Serve requests on a Unix socket until a shutdown request arrives.
+        """
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    reply = server.handle_line(raw.decode("utf-8"))
+                    if reply is not None:
+                        self.wfile.write(reply.encode("utf-8") + b"\n")
+                        self.wfile.flush()
+                    if not server.running:
+                        threading.Thread(target=unix_server.shutdown).start()
+                        break
+
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            # A stale socket from an earlier server; never remove anything else
+            if not stat.S_ISSOCK(mode):
+                raise RuntimeError(f"{path} exists and is not a socket")
+            os.remove(path)
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as unix_server:
+            unix_server.daemon_threads = True
+            try:
+                unix_server.serve_forever()
+            finally:
+                os.remove(path)
+
+
+def result_to_dict(result: CompileResult) -> dict:
+    return {
+        "path": result.path,
+        "index": result.index,
+        "name": result.name,
+        "schedule": result.schedule,
+        "lowered": result.lowered,
+        "error": result.error,
+        "timed_out": result.timed_out,
+    }
+
+
+def result_from_dict(data: dict) -> CompileResult:
+    return CompileResult(
+        data["path"],
+        data["index"],
+        data["name"],
+        schedule=data["schedule"],
+        lowered=data["lowered"],
+        error=data["error"],
+        timed_out=data.get("timed_out", False),
+    )
+
+
+class CompileClient:
+    def __init__(self, path: str):
+        """
+        A connection to a compile server listening on a Unix socket.
+
+        Args:
+            path (str): The socket path.
+        """
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.stream = self.sock.makefile("rwb")
+        self.next_id = 0
+
+    def request(self, payload: dict) -> dict:
+        self.next_id += 1
+        payload = {"id": self.next_id, **payload}
+        self.stream.write(json.dumps(payload).encode("utf-8") + b"\n")
+        self.stream.flush()
+        line = self.stream.readline()
+        if not line:
+            raise RuntimeError("Compile server closed the connection")
+        return json.loads(line)
+
+    def compile(self, path: str) -> List[CompileResult]:
+        """
+        Compile every component of a file on the server. Errors reading the
+        file come back as a single file-level result.
+        """
+        response = self.request({"op": "compile", "path": os.path.abspath(path)})
+        if "error" in response:
+            return [CompileResult(path, None, None, error=response["error"])]
+        return [result_from_dict(result) for result in response["results"]]
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def serve(address: str, use_cache: bool = True):
+    """
+    Run a compile server on stdin/stdout when `address` is "-", otherwise on
+    the Unix socket at `address`.
+    """
+    server = CompileServer(use_cache=use_cache)
+    if address == "-":
+        server.serve_stream(sys.stdin, sys.stdout)
+    else:
+        server.serve_unix(address)
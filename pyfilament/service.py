@@ -0,0 +1,172 @@
+"""
+An asyncio API for embedding the compiler in a service.
+
+Every component is compiled in its own worker process, so a design that
+makes the solver run away can be killed without affecting anything else.
+Concurrency is capped by a semaphore, each z3 query gets a timeout, and the
+worker as a whole gets a wall-clock deadline:
+
+    service = CompileService(max_concurrency=4, timeout=10.0)
+    result = await service.compile_component(expr)
+    if result.timed_out:
+        ...
+    await service.close()
+"""
+import asyncio
+import multiprocessing
+from typing import Optional, Set
+
+from pyfilament.compiler import CompileResult, compile_expr, describe_error
+from pyfilament.parse import parse
+from pyfilament.sexpr import SExpr
+
+# Extra wall-clock time a worker gets beyond its solver timeout before it is
+# killed, to cover elaboration, lowering and reporting back.
+GRACE_SECONDS = 1.0
+
+
+def compile_worker(conn, source: str, use_cache: bool, timeout_ms, rlimit):
+    """
+    Compile one component in a worker process and send the outcome over
+    `conn` as ("ok", schedule, lowered) or ("error", message, timed_out).
+    """
+    from pyfilament.z3_solver import SolverTimeout
+
+    try:
+        schedule, lowered = compile_expr(parse(source)[0], use_cache, timeout_ms, rlimit)
+        conn.send(("ok", schedule, lowered))
+    except SolverTimeout as err:
+        conn.send(("error", describe_error(err), True))
+    except Exception as err:
+        conn.send(("error", describe_error(err), False))
+    finally:
+        conn.close()
+
+
+class CompileService:
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        rlimit: Optional[int] = None,
+        use_cache: bool = True,
+        mp_context=None,
+    ):
+        """
+        Compiles components concurrently in worker processes.
+
+        Args:
+            max_concurrency (Optional[int]): How many components may compile
+                at once; defaults to the CPU count.
+            timeout (Optional[float]): Default seconds allowed per component,
+                or None for no limit.
+            rlimit (Optional[int]): z3 resource limit for each solver query.
+            use_cache (bool): Consult the on-disk compilation cache.
+            mp_context: The multiprocessing context to start workers with.
+        """
+        self.max_concurrency = max_concurrency or multiprocessing.cpu_count()
+        self.timeout = timeout
+        self.rlimit = rlimit
+        self.use_cache = use_cache
+        self.mp_context = mp_context or multiprocessing.get_context()
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.workers: Set[multiprocessing.Process] = set()
+
+    async def compile_component(
+        self,
+        expr: SExpr,
+        timeout: Optional[float] = None,
+        path: str = "<service>",
+        index: int = 0,
+    ) -> CompileResult:
+        """
+        Compile one component, waiting for a free worker slot first.
+
+        Never raises for a failing component: errors and timeouts come back
+        in the result, with `timed_out` set for the latter. Cancelling the
+        awaiting task kills the worker.
+
+        Args:
+            expr (SExpr): The component definition.
+            timeout (Optional[float]): Seconds allowed, overriding the
+                service default.
+            path (str): Reported as the result's path.
+            index (int): Reported as the result's index.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        name = expr["comp"]
+        result = CompileResult(path, index, name if isinstance(name, str) else None)
+        async with self.semaphore:
+            outcome = await self.run_worker(str(expr), timeout)
+        if outcome is None:
+            result.error = f"Timeout: compilation exceeded {timeout} seconds"
+            result.timed_out = True
+        elif outcome[0] == "ok":
+            result.schedule, result.lowered = outcome[1], outcome[2]
+        else:
+            result.error, result.timed_out = outcome[1], outcome[2]
+        return result
+
+    async def run_worker(self, source: str, timeout: Optional[float]):
+        """
+        Run compile_worker in a new process, returning what it sent back, or
+        None if it had to be killed at the deadline.
+        """
+        loop = asyncio.get_running_loop()
+        receiver, sender = self.mp_context.Pipe(duplex=False)
+        timeout_ms = None if timeout is None else max(1, int(timeout * 1000))
+        worker = self.mp_context.Process(
+            target=compile_worker,
+            args=(sender, source, self.use_cache, timeout_ms, self.rlimit),
+            daemon=True,
+        )
+        worker.start()
+        sender.close()
+        self.workers.add(worker)
+
+        ready = loop.create_future()
+        loop.add_reader(receiver.fileno(), lambda: ready.done() or ready.set_result(None))
+        try:
+            deadline = None if timeout is None else timeout + GRACE_SECONDS
+            try:
+                await asyncio.wait_for(ready, deadline)
+            except asyncio.TimeoutError:
+                return None
+            try:
+                return receiver.recv()
+            except EOFError:
+                worker.join()
+                return ("error", f"Worker exited with code {worker.exitcode}", False)
+        finally:
+            loop.remove_reader(receiver.fileno())
+            receiver.close()
+            self.stop_worker(worker)
+
+    def stop_worker(self, worker: multiprocessing.Process):
+        if worker.is_alive():
+            worker.kill()
+        worker.join()
+        self.workers.discard(worker)
+
+    async def close(self):
+        """
+        Kill any workers still running.
+        """
+        for worker in list(self.workers):
+            self.stop_worker(worker)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+async def compile_component(
+    expr: SExpr, timeout: Optional[float] = None, use_cache: bool = True
+) -> CompileResult:
+    """
+    Compile one component in a worker process with a one-off service.
+    """
+    async with CompileService(max_concurrency=1, timeout=timeout, use_cache=use_cache) as service:
+        return await service.compile_component(expr)
@@ -1,9 +1,15 @@
-from z3 import Int
+import sys
+import weakref
 
 
 class SExpr:
+    __slots__ = ("as_list", "_index", "__weakref__")
+
     def __init__(self, l):
-        self.as_list = l
+        # Stored as a tuple; the keyword index is only built on the first
+        # string lookup.
+        self.as_list = tuple(l)
+        self._index = None
 
     def eval(self):
         if not can_eval(self):
@@ -21,14 +27,29 @@ class SExpr:
         if isinstance(key, int) or isinstance(key, slice):
             return self.as_list[key]
         elif isinstance(key, str):
-            for i, item in enumerate(self.as_list):
-                if isinstance(item, str):
-                    if item == key and i + 1 < len(self):
-                        return self[i + 1]
-                elif isinstance(item, SExpr):
-                    if len(item) > 0 and isinstance(item[0], str):
-                        if item[0] == key:
-                            return item.as_list[1:]
+            if self._index is None:
+                self._index = self.build_index()
+            return self._index.get(key)
+
+    def build_index(self) -> dict:
+        """
+        Map each keyword to what a string lookup returns for it: the item
+        following a bare atom, or the tail of a list headed by the keyword.
+        The first occurrence of a keyword wins.
+        """
+        index = {}
+        items = self.as_list
+        for i, item in enumerate(items):
+            if isinstance(item, str):
+                if i + 1 < len(items) and item not in index:
+                    index[item] = items[i + 1]
+            elif isinstance(item, SExpr):
+                if len(item) > 0 and isinstance(item[0], str) and item[0] not in index:
+                    index[item[0]] = item.as_list[1:]
+        return index
+
+    def __iter__(self):
+        return iter(self.as_list)
 
     def __str__(self):
         return "(" + " ".join(map(str, self.as_list)) + ")"
@@ -66,6 +87,28 @@ def can_eval(expr: SExpr | str) -> bool:
             raise TypeError("Expected SExpr or string")
 
 
+# Canonical node for each distinct expression, keyed on its (already
+# canonical) children so that lookups compare children by identity. Nodes
+# are only held weakly, so a long-running process does not keep every
+# expression it has ever seen alive.
+_hashcons_table: "weakref.WeakValueDictionary[tuple, SExpr]" = weakref.WeakValueDictionary()
+
+
+def hashcons(expr: SExpr | str) -> SExpr | str:
+    """
+    Return the single shared node structurally equal to the given expression.
+    Atoms are interned and lists are rebuilt bottom-up from canonical children.
+    """
+    if isinstance(expr, str):
+        return sys.intern(expr)
+    key = tuple(hashcons(item) for item in expr.as_list)
+    node = _hashcons_table.get(key)
+    if node is None:
+        node = SExpr(key)
+        _hashcons_table[key] = node
+    return node
+
+
 def print_expr(expr: SExpr):
     """
     expects (G) or (+ G 3)
@@ -80,10 +123,13 @@ def eval_expr(expr: SExpr | str):
     """
     Turns an arithmetic SExpr into a Z3 expression that can be used as part of a constraint
     """
+    # z3 is only loaded once a constraint is actually built
+    from z3 import Int, IntVal
+
     match expr:
         case str(expr):
             if expr.isdecimal():
-                return Int(int(expr))
+                return IntVal(int(expr))
             if len(expr) > 0 and expr[0].isalpha():
                 return Int(expr)
             raise RuntimeError(f"Unable to evaluate {expr} as arithmetic expression")
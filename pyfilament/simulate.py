@@ -0,0 +1,286 @@
+"""
+A cycle-accurate simulator for lowered components.
+
+Runs a whole batch of input vectors at once: every signal is a pair of NumPy
+arrays holding its value and whether that value is defined, one entry per
+vector. Input ports are only driven with their stimulus during their
+availability window and with junk outside it, so an output that is valid
+for its whole window shows the schedule really delivers it on time.
+
+    lowered = generate_lower(component)
+    result = simulate(lowered, random_inputs(lowered.signature, 4096))
+    assert result.ok, result.violations
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pyfilament.command import Connect, Instance, Invoke
+from pyfilament.component import Component
+from pyfilament.fsm import Fsm
+from pyfilament.port import Port
+
+# A signal across the batch: (values, defined)
+Signal = Tuple[np.ndarray, np.ndarray]
+
+COMBINATIONAL = {
+    "Add": lambda left, right: left + right,
+    "And": lambda left, right: left & right,
+    "Or": lambda left, right: left | right,
+    "Xor": lambda left, right: left ^ right,
+}
+
+# Cycles between a Mult's inputs and its output
+MULT_LATENCY = 2
+
+
+def port_window(port: Port) -> Tuple[int, int]:
+    """
+    The cycles [lo, hi) a port is live in, for an invocation at cycle 0.
+    """
+    lo = port.range_.lo.eval_event()
+    hi = port.range_.hi.eval_event() if port.range_.hi is not None else lo + 1
+    return lo, hi
+
+
+def width_mask(width) -> np.uint64:
+    width = int(width) if width else 64
+    return np.uint64((1 << width) - 1 if width < 64 else (1 << 64) - 1)
+
+
+def random_inputs(signature, batch: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Uniformly random stimulus for every input port of a signature.
+    """
+    rng = np.random.default_rng(seed)
+    return {
+        port.name: rng.integers(0, 1 << min(port.width, 63), size=batch, dtype=np.uint64)
+        for port in signature.in_ports
+    }
+
+
+class SimulationResult:
+    def __init__(self, outputs: Dict[str, np.ndarray], violations: List[str], cycles: int):
+        """
+        The outcome of simulating a batch.
+
+        Args:
+            outputs (Dict[str, np.ndarray]): Each output port's values,
+                sampled at the start of its availability window.
+            violations (List[str]): Outputs that were undefined during their
+                window, or that disagreed with the reference model.
+            cycles (int): How many cycles were simulated.
+        """
+        self.outputs = outputs
+        self.violations = violations
+        self.cycles = cycles
+
+    @property
+    def ok(self) -> bool:
+        return not self.violations
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"{len(self.violations)} violation(s)"
+        return f"SimulationResult({self.cycles} cycles: {status})"
+
+
+class Simulator:
+    def __init__(self, lowered: Component):
+        """
+        Prepare a lowered component for simulation.
+
+        Args:
+            lowered (Component): The output of generate_lower.
+        """
+        self.component = lowered
+        self.signature = lowered.signature
+        self.instances: Dict[str, Instance] = {}
+        self.invokes: Dict[str, Invoke] = {}
+        # Destination -> (condition, value) of every connection driving it;
+        # the condition is None for an unconditional connection
+        self.drivers: Dict[str, List[Tuple[Optional[str], str]]] = {}
+        self.fsm: Optional[Fsm] = None
+        for cmd in lowered.commands:
+            if isinstance(cmd, Instance):
+                self.instances[cmd.variable] = cmd
+            elif isinstance(cmd, Invoke):
+                self.invokes[cmd.variable] = cmd
+            elif isinstance(cmd, Connect):
+                # Lowered connections read `dest = condition ? value`
+                if cmd.guard is None:
+                    driver = (None, cmd.src)
+                else:
+                    driver = (cmd.src, cmd.guard)
+                self.drivers.setdefault(cmd.dest, []).append(driver)
+            elif isinstance(cmd, Fsm):
+                self.fsm = cmd
+
+        self.inputs = {port.name: port for port in self.signature.in_ports}
+        self.windows = {
+            port.name: port_window(port)
+            for port in self.signature.in_ports + self.signature.out_ports
+        }
+
+    def kind(self, invoke: str) -> str:
+        instance = self.instances.get(self.invokes[invoke].function)
+        if instance is None:
+            raise RuntimeError(f"Cannot simulate invoke {invoke} of an unknown instance")
+        return instance.type_name
+
+    def run(
+        self,
+        inputs: Dict[str, np.ndarray],
+        reference: Optional[Callable[[Dict[str, np.ndarray]], Dict[str, np.ndarray]]] = None,
+        cycles: Optional[int] = None,
+        seed: int = 0,
+    ) -> SimulationResult:
+        """
+        Simulate one invocation of the component, at cycle 0, for every
+        input vector in the batch.
+
+        Args:
+            inputs (Dict[str, np.ndarray]): A value per vector for every
+                input port.
+            reference (Optional[Callable]): Computes the expected value of
+                each output port from the inputs, to compare against.
+            cycles (Optional[int]): How long to simulate; by default until
+                every output window has closed.
+            seed (int): Seeds the junk driven onto inputs outside their window.
+        """
+        batch = len(next(iter(inputs.values()))) if inputs else 1
+        rng = np.random.default_rng(seed)
+        cycles = cycles or max((hi for _, hi in self.windows.values()), default=1)
+        junk = {name: rng.integers(0, 1 << 63, size=batch, dtype=np.uint64) for name in inputs}
+        stimulus = {name: np.asarray(values, dtype=np.uint64) for name, values in inputs.items()}
+        undefined = (np.zeros(batch, dtype=np.uint64), np.zeros(batch, dtype=bool))
+        defined = np.ones(batch, dtype=bool)
+
+        # State carried across clock edges
+        registers: Dict[str, Signal] = {}
+        pipelines: Dict[str, List[Signal]] = {}
+        for name in self.invokes:
+            kind = self.kind(name)
+            if kind == "Register":
+                registers[name] = undefined
+            elif kind == "Mult":
+                pipelines[name] = [undefined] * MULT_LATENCY
+
+        samples: Dict[str, np.ndarray] = {}
+        violations: List[str] = []
+        for cycle in range(cycles):
+            values: Dict[str, Signal] = {}
+
+            def signal(name: str, visiting=()) -> Signal:
+                if name in values:
+                    return values[name]
+                if name in visiting:
+                    raise RuntimeError(f"Combinational loop through {name}")
+                visiting = visiting + (name,)
+
+                if name in self.inputs:
+                    lo, hi = self.windows[name]
+                    if lo <= cycle < hi:
+                        result = (stimulus[name], defined)
+                    else:
+                        result = (junk[name], ~defined)
+                elif self.fsm is not None and name.startswith(f"{self.fsm.name}._"):
+                    # The FSM is a delay line of its trigger: state k is
+                    # active k cycles after the invocation
+                    state = int(name.rsplit("_", 1)[1])
+                    if state < self.fsm.states:
+                        result = (np.full(batch, int(cycle == state), dtype=np.uint64), defined)
+                    else:
+                        # No such port; reading it is a lowering bug
+                        result = undefined
+                        problem = (
+                            f"{name} is read but {self.fsm.name} only has {self.fsm.states} states"
+                        )
+                        if problem not in violations:
+                            violations.append(problem)
+                elif name.endswith(".out") and name[:-4] in self.invokes:
+                    result = output(name[:-4], visiting)
+                else:
+                    result = undefined
+                    for condition, value in self.drivers.get(name, []):
+                        driven = signal(value, visiting)
+                        if condition is None:
+                            result = driven
+                            continue
+                        active, known = signal(condition, visiting)
+                        enable = (active != 0) & known
+                        result = (
+                            np.where(enable, driven[0], result[0]),
+                            np.where(enable, driven[1], result[1]),
+                        )
+                values[name] = result
+                return result
+
+            def output(invoke: str, visiting) -> Signal:
+                kind = self.kind(invoke)
+                mask = width_mask(self.instances[self.invokes[invoke].function].size)
+                if kind == "Register":
+                    return registers[invoke]
+                if kind == "Mult":
+                    return pipelines[invoke][-1]
+                if kind in COMBINATIONAL:
+                    left = signal(f"{invoke}.left", visiting)
+                    right = signal(f"{invoke}.right", visiting)
+                    return COMBINATIONAL[kind](left[0], right[0]) & mask, left[1] & right[1]
+                if kind == "Mux":
+                    sel = signal(f"{invoke}.sel", visiting)
+                    in0 = signal(f"{invoke}.in0", visiting)
+                    in1 = signal(f"{invoke}.in1", visiting)
+                    choose = sel[0] != 0
+                    return (
+                        np.where(choose, in1[0], in0[0]),
+                        sel[1] & np.where(choose, in1[1], in0[1]),
+                    )
+                raise RuntimeError(f"Cannot simulate {kind} invoke {invoke}")
+
+            for port in self.signature.out_ports:
+                lo, hi = self.windows[port.name]
+                if lo <= cycle < hi:
+                    value, known = signal(port.name)
+                    if not known.all():
+                        violations.append(
+                            f"{port.name} is undefined at cycle {cycle} for "
+                            f"{int((~known).sum())} of {batch} vectors"
+                        )
+                    if cycle == lo:
+                        samples[port.name] = value & width_mask(port.width)
+
+            # Clock edge
+            for name in registers:
+                enable, known = signal(f"{name}.write_en")
+                write = (enable != 0) & known
+                data = signal(f"{name}.in")
+                old = registers[name]
+                registers[name] = (np.where(write, data[0], old[0]), np.where(write, data[1], old[1]))
+            for name, stages in pipelines.items():
+                mask = width_mask(self.instances[self.invokes[name].function].size)
+                left, right = signal(f"{name}.left"), signal(f"{name}.right")
+                product = ((left[0] * right[0]) & mask, left[1] & right[1])
+                pipelines[name] = [product] + stages[:-1]
+
+        if reference is not None:
+            for name, expected in reference(stimulus).items():
+                port = next(p for p in self.signature.out_ports if p.name == name)
+                expected = np.asarray(expected, dtype=np.uint64) & width_mask(port.width)
+                wrong = samples.get(name) != expected
+                if np.any(wrong):
+                    violations.append(
+                        f"{name} differs from the reference for "
+                        f"{int(np.count_nonzero(wrong))} of {batch} vectors"
+                    )
+        return SimulationResult(samples, violations, cycles)
+
+
+def simulate(
+    lowered: Component,
+    inputs: Dict[str, np.ndarray],
+    reference: Optional[Callable[[Dict[str, np.ndarray]], Dict[str, np.ndarray]]] = None,
+) -> SimulationResult:
+    """
+    Simulate a lowered component over a batch of input vectors.
+    """
+    return Simulator(lowered).run(inputs, reference)
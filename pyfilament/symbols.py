@@ -0,0 +1,59 @@
+"""
+Interned names and per-component symbol tables.
+
+Every name a component mentions gets a small integer id in its component's
+SymbolTable, and a dotted reference like `a0.out` is split once into the ids
+of its instance and port when the component's dataflow graph is built.
+Passes that join on names then compare integers: the graph resolves
+references by id, and the solvers key start times on the ids of command
+variables and ports, turning them back into names only to report a
+schedule. Read-only passes use `get`, which never adds a name.
+"""
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# Port id of a reference with no port, like `left` rather than `a0.out`
+NO_PORT = -1
+
+# A resolved reference: (instance or port symbol, port symbol or NO_PORT)
+Ref = Tuple[int, int]
+
+
+class SymbolTable:
+    __slots__ = ("names", "ids")
+
+    def __init__(self):
+        """
+        An empty table; symbols are numbered in the order they are interned.
+        """
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def intern(self, name: str) -> int:
+        """
+        The id of a name, adding it to the table if it is new.
+        """
+        sym = self.ids.get(name)
+        if sym is None:
+            sym = self.ids[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return sym
+
+    def get(self, name: str) -> Optional[int]:
+        return self.ids.get(name)
+
+    def name(self, sym: int) -> str:
+        return self.names[sym]
+
+    def ref(self, name: str) -> Ref:
+        """
+        Split a reference like `a0.out` into the ids of `a0` and `out`.
+        """
+        base, dot, port = name.partition(".")
+        return self.intern(base), self.intern(port) if dot else NO_PORT
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def __len__(self):
+        return len(self.names)
@@ -1,92 +1,296 @@
-from z3 import sat, Int, Solver, Or, And, Implies
+from typing import Optional
 
+from z3 import sat, unknown, Bool, Int, Solver, Not, Or, Implies
+
+from pyfilament import metrics
 from pyfilament.command import Instance, Invoke, Connect
 from pyfilament.component import Component
+from pyfilament.difference import NotDifferenceLogic, solve_difference_constraints
+
+
+class SolverTimeout(RuntimeError):
+    """
+    z3 gave up on a query before deciding it, on a timeout or resource limit.
+    """
 
 
-def solve_component_constraints(component: Component):
+def solve_component_constraints(
+    component: Component,
+    timeout: Optional[int] = None,
+    rlimit: Optional[int] = None,
+    use_cache: bool = True,
+):
     """
     Argsuments- component: A Component instance containing its signature and commands.
+                timeout: Milliseconds z3 may spend on each query.
+                rlimit: z3 resource limit for each query.
+                use_cache: Reuse the schedule of a component that differs
+                    only in names, and remember this one's.
 
     Returns-  A dictionary with resolved start times and FSM state transitions.
+
+    Components whose constraints are all difference constraints are solved
+    natively; z3 is only used for anything outside that fragment. Raises
+    SolverTimeout if z3 hits either limit.
     """
-    solver = Solver()
 
+    def solve(component: Component):
+        try:
+            return solve_difference_constraints(component)
+        except NotDifferenceLogic:
+            return solve_with_z3(component, timeout=timeout, rlimit=rlimit)
+
+    if use_cache:
+        from pyfilament.canonical import solve_cached
+
+        return solve_cached(component, solve)
+    return solve(component)
+
+
+def component_start_times(component: Component):
+    """
+    Map the symbol of every command variable and signature port to its z3
+    start time.
+    """
+    graph = component.graph
+    symbols = component.symbols
     # Define start times for all commands
     start_times = {
-        cmd.variable: Int(f"{cmd.variable}_start")
+        graph.symbol(cmd): Int(f"{cmd.variable}_start")
         for cmd in component.commands
         if hasattr(cmd, "variable")
     }
 
     # use ports from signature
     for port in component.signature.in_ports:
-        start_times[port.name] = port.range_.lo.eval_constraint()
+        start_times[symbols.get(port.name)] = port.range_.lo.eval_constraint()
     for port in component.signature.out_ports:
-        start_times[port.name] = port.range_.lo.eval_constraint()
+        start_times[symbols.get(port.name)] = port.range_.lo.eval_constraint()
+    return start_times
 
-    # Define FSM states and add state constraints
+
+def component_states(component: Component):
+    """
+    Map the FSM state names of a component to their z3 activity variables.
+    """
     # here event is a list of event definitions as SExprs
     fsm_states = component.signature.event[0][1]
-    states = {
+    return {
         f"{fsm_states}_{i}": Int(f"{fsm_states}_{i}_active") for i in range(4)
     }  # Assuming 4 cycles
 
-    solver.add(Int("G") == 0)
-    # Timing constraints for commands
-    for cmd in component.commands:
-        if isinstance(cmd, Instance):
-            # pass
-            solver.add(start_times[cmd.variable] >= 0)  # Non-negative start time
-
-        elif isinstance(cmd, Invoke):
-            # Add timing constraints based on range
-            if len(cmd.range_) == 1:
-                solver.add(start_times[cmd.variable] == cmd.range_.lo.eval_constraint())
-            elif len(cmd.range_) == 2:
-                solver.add(start_times[cmd.variable] >= cmd.range_.lo.eval_constraint())
-                solver.add(start_times[cmd.variable] <= cmd.range_.hi.eval_constraint())
-            elif len(cmd.range_) == 3:
-                solver.add(start_times[cmd.variable] == 3)
-            else:
-                raise RuntimeError(
-                    f"Too many timing constraints in invocation - {cmd}: {cmd.range_}"
-                )
 
-        elif isinstance(cmd, Connect):
-            # Ensure connection happens only after the source produces its output
-            src_start_time = start_times.get(cmd.src.split(".")[0], None)
-            dest_start_time = start_times.get(cmd.dest.split(".")[0], None)
-            if src_start_time is not None and dest_start_time is not None:
-                solver.add(dest_start_time >= src_start_time)
-            else:
-                if src_start_time is None:
-                    raise RuntimeError(f"Missing start time for variable {cmd.src}")
-                elif dest_start_time is None:
-                    raise RuntimeError(f"Missing start time for variable {cmd.dest}")
-
-    # FSM constraints
+def fsm_constraints(states) -> list:
+    """
+    Constraints tying together the FSM activity variables of a component.
+    """
+    names = list(states)
+    constraints = [Int("G") == 0]
     for cycle in range(4):  # Assume 4 cycles for the example
-        solver.add(
-            Or([states[f"{fsm_states}_{i}"] == 1 for i in range(4)])
+        constraints.append(
+            Or([states[name] == 1 for name in names])
         )  # Ensure one state active per cycle
         if cycle < 3:  # Add transitions between states
-            solver.add(
-                Implies(
-                    states[f"{fsm_states}_{cycle}"] == 1,
-                    states[f"{fsm_states}_{cycle + 1}"] == 1,
-                )
+            constraints.append(
+                Implies(states[names[cycle]] == 1, states[names[cycle + 1]] == 1)
             )
+    return constraints
+
+
+def command_constraints(cmd, start_times, graph) -> list:
+    """
+    Timing constraints contributed by a single command, with connections
+    resolved through the component's dataflow graph. `start_times` is keyed
+    by symbol, as component_start_times returns it.
+    """
+    if isinstance(cmd, Instance):
+        return [start_times[graph.symbol(cmd)] >= 0]  # Non-negative start time
+
+    elif isinstance(cmd, Invoke):
+        start = start_times[graph.symbol(cmd)]
+        # Add timing constraints based on range
+        if len(cmd.range_) == 1:
+            return [start == cmd.range_.lo.eval_constraint()]
+        elif len(cmd.range_) == 2:
+            return [
+                start >= cmd.range_.lo.eval_constraint(),
+                start <= cmd.range_.hi.eval_constraint(),
+            ]
+        elif len(cmd.range_) == 3:
+            return [start == 3]
+        raise RuntimeError(
+            f"Too many timing constraints in invocation - {cmd}: {cmd.range_}"
+        )
+
+    elif isinstance(cmd, Connect):
+        # Ensure connection happens only after the source produces its output
+        src, dest = graph.connect_refs(cmd)
+        src_start_time = start_times.get(src[0], None)
+        dest_start_time = start_times.get(dest[0], None)
+        if src_start_time is None:
+            raise RuntimeError(f"Missing start time for variable {cmd.src}")
+        elif dest_start_time is None:
+            raise RuntimeError(f"Missing start time for variable {cmd.dest}")
+        return [dest_start_time >= src_start_time]
+
+    return []
+
+
+def model_results(model, start_times, states, symbols):
+    """
+    Read the concrete start times, by name, and FSM states out of a z3 model.
+    """
+    return {
+        "start_times": {
+            symbols.names[sym]: model.eval(term, model_completion=True).as_long()
+            for sym, term in start_times.items()
+        },
+        "states": {
+            state: model.eval(term, model_completion=True).as_long()
+            for state, term in states.items()
+        },
+    }
+
+
+def limit_solver(solver: Solver, timeout: Optional[int] = None, rlimit: Optional[int] = None):
+    if timeout is not None:
+        solver.set("timeout", int(timeout))
+    if rlimit is not None:
+        solver.set("rlimit", int(rlimit))
+
+
+def solve_with_z3(
+    component: Component, timeout: Optional[int] = None, rlimit: Optional[int] = None
+):
+    """
+    Solve the timing constraints of a component with z3.
+    """
+    with metrics.stage("solve.constraints"):
+        solver = Solver()
+        limit_solver(solver, timeout, rlimit)
+        start_times = component_start_times(component)
+        states = component_states(component)
+
+        solver.add(fsm_constraints(states))
+        # Timing constraints for commands
+        for cmd in component.commands:
+            solver.add(command_constraints(cmd, start_times, component.graph))
 
     # Solve constraints
-    if solver.check() == sat:
-        model = solver.model()
-        # print(model)
-        results = {
-            "start_times": start_times,
-            "states": {state: model[states[state]].as_long() for state in states},
-        }
-        return results
+    if check(solver) == sat:
+        return model_results(solver.model(), start_times, states, component.symbols)
     else:
-        # print(solver.assertions())
+        return None
+
+
+def check(solver: Solver, *assumptions):
+    """
+    Run solver.check, reporting its time, assertion count and statistics to
+    any active metrics. Raises SolverTimeout if z3 could not decide the query.
+    """
+    if metrics.active is None:
+        result = solver.check(*assumptions)
+    else:
+        with metrics.stage("solve.check"):
+            result = solver.check(*assumptions)
+        metrics.count("z3_assertions", len(solver.assertions()))
+        metrics.active.record_z3_statistics(solver.statistics())
+    if result == unknown:
+        raise SolverTimeout(f"Solver gave up: {solver.reason_unknown()}")
+    return result
+
+
+def command_key(cmd):
+    """
+    Identify a command across edits of a component.
+    """
+    if isinstance(cmd, Connect):
+        return ("connect", cmd.dest, cmd.src)
+    return (cmd.__class__.__name__.lower(), getattr(cmd, "variable", None))
+
+
+class SolverSession:
+    def __init__(self, component: Component):
+        """
+        An incremental z3 solver for one component being edited.
+
+        Each command's constraints are asserted once under their own guard
+        literal and enabled through check assumptions, so updating the
+        component only asserts the commands that actually changed.
+
+        Args:
+            component (Component): The component to solve.
+        """
+        self.solver = Solver()
+        self.signature = None
+        self.groups = {}
+        self.generation = 0
+        self.update(component)
+
+    def reset(self, component: Component):
+        self.solver.reset()
+        self.signature = repr(component.signature)
+        self.groups = {}
+        self.start_times = component_start_times(component)
+        self.states = component_states(component)
+        self.solver.add(fsm_constraints(self.states))
+
+    def update(self, component: Component):
+        """
+        Bring the session in line with an edited version of the component.
+
+        Returns the number of commands whose constraints were (re)asserted.
+        """
+        if repr(component.signature) != self.signature:
+            self.reset(component)
+        else:
+            self.start_times = component_start_times(component)
+        # start_times is keyed by the symbols of this version of the component
+        self.symbols = component.symbols
+
+        asserted = 0
+        groups = {}
+        for cmd in component.commands:
+            key = command_key(cmd)
+            fingerprint = repr(cmd)
+            if isinstance(cmd, Connect):
+                # A connection is only valid while both of its ends are
+                # defined, which edits elsewhere in the component can change
+                fingerprint += "".join(
+                    "+" if end[0] in self.start_times else "-"
+                    for end in component.graph.connect_refs(cmd)
+                )
+            group = self.groups.pop(key, None)
+            if group is not None and group[1] == fingerprint:
+                groups[key] = group
+                continue
+            if group is not None:
+                # Permanently retire the guard of the outdated constraints
+                self.solver.add(Not(group[0]))
+            self.generation += 1
+            guard = Bool(f"cmd!{self.generation}")
+            self.solver.add(
+                [
+                    Implies(guard, c)
+                    for c in command_constraints(cmd, self.start_times, component.graph)
+                ]
+            )
+            groups[key] = (guard, fingerprint)
+            asserted += 1
+
+        # Commands that were removed from the component
+        for guard, _ in self.groups.values():
+            self.solver.add(Not(guard))
+        self.groups = groups
+        return asserted
+
+    def check(self):
+        """
+        Solve the current constraints, in the same form as `solve_with_z3`.
+        """
+        guards = [guard for guard, _ in self.groups.values()]
+        if check(self.solver, *guards) == sat:
+            return model_results(
+                self.solver.model(), self.start_times, self.states, self.symbols
+            )
         return None
@@ -0,0 +1,262 @@
+"""
+Golden-output regression runner.
+
+Compiles every example that has a golden lowered output in this directory,
+in parallel, and compares the result structurally: whitespace is ignored,
+statements may appear in any order, and instances and invokes may be
+renamed consistently. Each stage is timed too, and the run fails if a stage
+got slower than the stored baseline by more than the allowed margin.
+
+An entry of golden.json may instead name an example that must fail to
+compile, as {"example": "examples/NAME.fil", "expect-error": "TimingError"};
+it passes when compiling fails with an error starting with that text.
+
+    python -m tests.run [-j N] [--margin 0.5] [--update-baseline]
+"""
+import json
+import os
+import re
+import sys
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from pyfilament import metrics
+from pyfilament.compiler import compile_expr, describe_error
+from pyfilament.parse import iter_file
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TESTS)
+
+STAGES = ("parse", "elaborate", "check", "solve", "lower")
+
+DEFAULT_BASELINE = os.path.join(TESTS, "baseline.json")
+
+# One statement of a lowered component, canonicalized for comparison
+Statement = Tuple[str, ...]
+
+STATEMENT_RE = [
+    ("new", re.compile(r"^(\S+) := new (\S+)$")),
+    ("invoke", re.compile(r"^(\S+) := invoke ([^<\s]+)<([^>]*)>(?:\((.*)\))?$")),
+    ("connect", re.compile(r"^(\S+) = (\S+) \? (\S+)$")),
+    ("connect", re.compile(r"^(\S+) = (\S+)$")),
+    ("fsm", re.compile(r"^fsm (\S+)\[(\d+)\]\((\S+)\)$")),
+]
+
+
+def discover(manifest: Optional[str] = None) -> Dict[str, Tuple[str, Optional[str]]]:
+    """
+    Golden file -> (example source, expected error or None), from the
+    manifest plus every pyf-NAME golden file with a matching
+    examples/NAME.fil.
+    """
+    cases = {}
+    for name in sorted(os.listdir(TESTS)):
+        example = os.path.join(ROOT, "examples", f"{name[4:]}.fil")
+        if name.startswith("pyf-") and os.path.exists(example):
+            cases[name] = (example, None)
+    manifest = manifest or os.path.join(TESTS, "golden.json")
+    if os.path.exists(manifest):
+        with open(manifest, "r", encoding="utf-8") as fp:
+            for name, entry in json.load(fp).items():
+                if isinstance(entry, str):
+                    entry = {"example": entry}
+                cases[name] = (os.path.join(ROOT, entry["example"]), entry.get("expect-error"))
+    return cases
+
+
+def statements(text: str) -> Tuple[str, List[Tuple[Statement, str]]]:
+    """
+    Split lowered Filament into its header and its statements, each parsed
+    into a tuple alongside its original text.
+    """
+    header, _, body = text.partition("{")
+    parsed = []
+    for raw in body.rsplit("}", 1)[0].split(";"):
+        line = " ".join(raw.split())
+        if not line:
+            continue
+        for kind, pattern in STATEMENT_RE:
+            match = pattern.match(line)
+            if match:
+                fields = tuple((field or "").replace(" ", "") for field in match.groups())
+                parsed.append(((kind, *fields), line))
+                break
+        else:
+            parsed.append((("text", line), line))
+    return "".join(header.split()), parsed
+
+
+def canonicalize(parsed: List[Tuple[Statement, str]]) -> List[Statement]:
+    """
+    Rename instances and invokes by their order of definition, so designs
+    that differ only in those names compare equal.
+    """
+    names = {}
+    for statement, _ in parsed:
+        if statement[0] == "new":
+            names[statement[1]] = f"%inst{len(names)}"
+        elif statement[0] == "invoke":
+            names[statement[1]] = f"%inv{len(names)}"
+
+    def rename(ref: str) -> str:
+        base, dot, rest = ref.partition(".")
+        return names.get(base, base) + dot + rest
+
+    canonical = []
+    for statement, _ in parsed:
+        kind, fields = statement[0], statement[1:]
+        if kind == "new":
+            fields = (rename(fields[0]), fields[1])
+        elif kind == "invoke":
+            args = ",".join(rename(arg) for arg in fields[3].split(",") if arg)
+            fields = (rename(fields[0]), rename(fields[1]), fields[2], args)
+        elif kind == "connect":
+            fields = tuple(rename(field) for field in fields)
+        canonical.append((kind, *fields))
+    return canonical
+
+
+def structural_diff(expected: str, actual: str) -> List[str]:
+    """
+    The differences between two lowered components, as `- statement` for
+    one only in `expected` and `+ statement` for one only in `actual`.
+    """
+    header, golden = statements(expected)
+    actual_header, ours = statements(actual)
+    diff = []
+    if header != actual_header:
+        diff.append(f"- {expected.partition('{')[0].strip()}")
+        diff.append(f"+ {actual.partition('{')[0].strip()}")
+
+    golden_canonical, ours_canonical = canonicalize(golden), canonicalize(ours)
+    missing = Counter(golden_canonical) - Counter(ours_canonical)
+    extra = Counter(ours_canonical) - Counter(golden_canonical)
+    for canonical, (_, line) in zip(golden_canonical, golden):
+        if missing[canonical] > 0:
+            missing[canonical] -= 1
+            diff.append(f"- {line};")
+    for canonical, (_, line) in zip(ours_canonical, ours):
+        if extra[canonical] > 0:
+            extra[canonical] -= 1
+            diff.append(f"+ {line};")
+    return diff
+
+
+def run_case(example: str, repeat: int = 1) -> dict:
+    """
+    Compile an example without the cache, returning its lowered text (or
+    error) and the best time of each stage over `repeat` runs.
+    """
+    best: Dict[str, float] = {}
+    lowered, error = None, None
+    for _ in range(repeat):
+        with metrics.collect() as measured:
+            try:
+                with metrics.stage("parse"):
+                    exprs = list(iter_file(example))
+                lowered = "\n".join(compile_expr(expr, use_cache=False)[1] for expr in exprs)
+            except Exception as err:
+                error = describe_error(err)
+        for stage in STAGES:
+            if stage in measured.stages:
+                best[stage] = min(best.get(stage, float("inf")), measured.stages[stage])
+    return {"lowered": lowered, "error": error, "stages": best}
+
+
+def timing_regressions(
+    stages: Dict[str, float], baseline: Dict[str, float], margin: float, min_seconds: float
+) -> List[str]:
+    """
+    Stages slower than their baseline by more than `margin` (a fraction),
+    ignoring differences under `min_seconds`, which are mostly noise.
+    """
+    slower = []
+    for stage, seconds in stages.items():
+        before = baseline.get(stage)
+        if before is None:
+            continue
+        if seconds > before * (1 + margin) and seconds - before > min_seconds:
+            slower.append(
+                f"{stage} took {seconds * 1000:.2f} ms, "
+                f"{seconds / before:.2f}x the baseline {before * 1000:.2f} ms"
+            )
+    return slower
+
+
+def main(argv=None) -> int:
+    parser = ArgumentParser(description="Compare compiled examples against golden outputs")
+    parser.add_argument("-j", "--jobs", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3, help="time each stage best-of N")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--margin", type=float, default=0.5, help="allowed slowdown over the baseline, as a fraction"
+    )
+    parser.add_argument(
+        "--min-ms", type=float, default=1.0, help="ignore slowdowns smaller than this"
+    )
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="store this run's timings as the baseline"
+    )
+    args = parser.parse_args(argv)
+
+    cases = discover()
+    names = list(cases)
+    if args.jobs == 1 or len(names) <= 1:
+        outcomes = [run_case(cases[name][0], args.repeat) for name in names]
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            examples = [cases[name][0] for name in names]
+            outcomes = list(pool.map(run_case, examples, [args.repeat] * len(names)))
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fp:
+            baseline = json.load(fp)["cases"]
+
+    failed = 0
+    for name, outcome in zip(names, outcomes):
+        timings = "  ".join(
+            f"{stage} {outcome['stages'][stage] * 1000:.2f}ms"
+            for stage in STAGES
+            if stage in outcome["stages"]
+        )
+        expected_error = cases[name][1]
+        if expected_error is not None:
+            expectation = f"expected an error starting with {expected_error!r}"
+            if outcome["error"] is None:
+                problems = [f"{expectation}, but it compiled"]
+            elif not outcome["error"].startswith(expected_error):
+                problems = [f"{expectation}: {outcome['error']}"]
+            else:
+                problems = []
+        elif outcome["error"] is not None:
+            problems = [f"error: {outcome['error']}"]
+        else:
+            with open(os.path.join(TESTS, name), "r", encoding="utf-8") as fp:
+                problems = structural_diff(fp.read(), outcome["lowered"])
+        if name in baseline:
+            problems += timing_regressions(
+                outcome["stages"], baseline[name], args.margin, args.min_ms / 1000
+            )
+        failed += bool(problems)
+        print(f"{'FAIL' if problems else 'ok':<4}  {name:<16} {timings}")
+        for problem in problems:
+            print("      " + problem.replace("\n", "\n      "))
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fp:
+            json.dump(
+                {"cases": {name: outcome["stages"] for name, outcome in zip(names, outcomes)}},
+                fp,
+                indent=2,
+            )
+        print(f"Baseline written to {args.baseline}")
+
+    print(f"\n{len(names) - failed} passed, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Regression tests for the resource-conflict sweep in InvokeIndex.
+
+    python -m unittest tests.test_intervals
+"""
+import unittest
+
+from pyfilament.check import precheck
+from pyfilament.component import Component
+from pyfilament.intervals import InvokeIndex
+from pyfilament.parse import parse
+
+
+def register_pair(first: str, second: str) -> Component:
+    """
+    A component invoking one register twice, over the given ranges.
+    """
+    source = f"""
+    (comp main
+      (events (event G:4))
+      (ports
+       (interface[1] (G) go)
+       (in-port[32] (G (+ G 5)) left)
+       (out-port[32] ((+ G 4) (+ G 5)) out))
+      (instantiate
+       (R (new Register[32])))
+      (invoke
+       (v0 (R ({first}) left))
+       (v3 (R ({second}) left)))
+      (connect (out left)))
+    """
+    return Component.from_sexpr(parse(source)[0])
+
+
+def conflicts(component: Component):
+    return [
+        (first.variable, second.variable, lo, hi)
+        for first, second, lo, hi in InvokeIndex(component).conflicts()
+    ]
+
+
+class ConflictTest(unittest.TestCase):
+    def test_overlap(self):
+        component = register_pair("(+ G 1) (+ G 3)", "(+ G 2) (+ G 4)")
+        self.assertEqual(conflicts(component), [("v0", "v3", 2, 3)])
+
+    def test_empty_interval(self):
+        component = register_pair("(+ G 2) (+ G 2)", "(+ G 1) (+ G 3)")
+        self.assertEqual(conflicts(component), [])
+        self.assertFalse(any("both use" in d.message for d in precheck(component)))
+
+    def test_inverted_interval(self):
+        component = register_pair("(+ G 2) (+ G 1)", "(+ G 1) (+ G 3)")
+        self.assertEqual(conflicts(component), [])
+        messages = [diagnostic.message for diagnostic in precheck(component)]
+        self.assertEqual(messages, ["Invoke v0 has an inverted range <G+2,G+1>"])
+
+
+if __name__ == "__main__":
+    unittest.main()